@@ -1,5 +1,12 @@
 import random
 
+import numpy as np
+
+from pairing import sample_pair_counts, sample_pair_counts_batch
+
+HAWK = 1
+DOVE = 0
+
 class Player:
     def __init__(self, type):
         self.type = type
@@ -12,11 +19,13 @@ class Player:
         self.food += amount
 
 class Simulation:
-    def __init__(self, num_hawks, num_doves):
+    # rng is anything with the random module's interface, e.g. random.Random(seed)
+    def __init__(self, num_hawks, num_doves, rng=random):
+        self.rng = rng
         self.population = [Player('Hawk') for _ in range(num_hawks)] + [Player('Dove') for _ in range(num_doves)]
 
     def pair_and_play(self):
-        random.shuffle(self.population)
+        self.rng.shuffle(self.population)
         next_population = []
 
         for i in range(0, len(self.population), 2):
@@ -57,10 +66,102 @@ class Simulation:
             num_doves = sum(1 for player in self.population if player.type == 'Dove')
             print(f"Round {round + 1}: Hawks = {num_hawks}, Doves = {num_doves}")
 
-#  Initialize and run the simulation
-num_hawks = 50
-num_doves = 51
-rounds = 10
+class ArraySimulation:
+    # Same rules as Simulation, but the population is an int8 array of HAWK/DOVE
+    # codes and a whole round is resolved with array operations.
+    def __init__(self, num_hawks, num_doves, rng=None):
+        self.population = np.full(num_hawks + num_doves, DOVE, dtype=np.int8)
+        self.population[:num_hawks] = HAWK
+        self.rng = rng if rng is not None else np.random.default_rng()
+
+    def pair_and_play(self):
+        self.rng.shuffle(self.population)
+        num_pairs = len(self.population) // 2
+
+        # The odd one out (if any) gets no partner and no food
+        player1 = self.population[0:2 * num_pairs:2]
+        player2 = self.population[1:2 * num_pairs:2]
+
+        hawk_dove = np.count_nonzero((player1 == HAWK) & (player2 == DOVE))
+        dove_hawk = np.count_nonzero((player1 == DOVE) & (player2 == HAWK))
+        dove_dove = np.count_nonzero((player1 == DOVE) & (player2 == DOVE))
+        # Hawk/Hawk pairs leave both players with no food
+
+        # A hawk that meets a dove gets 2 food (two offspring), the dove gets none.
+        # Both doves of a Dove/Dove pair get 1 food (one offspring each).
+        num_hawks = 2 * (hawk_dove + dove_hawk)
+        num_doves = 2 * dove_dove
+
+        next_population = np.full(num_hawks + num_doves, DOVE, dtype=np.int8)
+        next_population[:num_hawks] = HAWK
+        self.population = next_population
+
+    def run_simulation(self, rounds):
+        for round in range(rounds):
+            self.pair_and_play()
+            num_hawks = int(np.count_nonzero(self.population == HAWK))
+            num_doves = len(self.population) - num_hawks
+            print(f"Round {round + 1}: Hawks = {num_hawks}, Doves = {num_doves}")
+
+class AggregateSimulation:
+    # Only the hawk and dove counts are kept; each round samples how many pairs
+    # of each kind form and applies the payoffs in bulk, independent of size.
+    def __init__(self, num_hawks, num_doves, rng=None):
+        self.num_hawks = num_hawks
+        self.num_doves = num_doves
+        self.rng = rng if rng is not None else np.random.default_rng()
+
+    def pair_and_play(self):
+        hawk_hawk, hawk_dove, dove_dove = sample_pair_counts(self.num_hawks, self.num_doves, self.rng)
+        self.num_hawks = 2 * hawk_dove
+        self.num_doves = 2 * dove_dove
+
+    def run_simulation(self, rounds):
+        for round in range(rounds):
+            self.pair_and_play()
+            print(f"Round {round + 1}: Hawks = {self.num_hawks}, Doves = {self.num_doves}")
+
+def offspring(food):
+    # Children a player leaves for the food it got: 2 for 2 or more, 1 for any
+    return np.where(food >= 2, 2, np.where(food > 0, 1, 0))
+
+class BatchSimulation:
+    # Many independent AggregateSimulation worlds stepped together: num_hawks
+    # and num_doves hold one count per world. The food each side of a pair gets
+    # (defaults as in Simulation) can be a scalar or one value per world, which
+    # makes sweeping the payoffs a single run.
+    def __init__(self, num_hawks, num_doves, rng=None, hawk_hawk_food=0, hawk_dove_food=2, dove_hawk_food=0,
+                 dove_dove_food=1):
+        self.num_hawks, self.num_doves = (np.array(counts, dtype=np.int64)
+                                          for counts in np.broadcast_arrays(num_hawks, num_doves))
+        self.rng = rng if rng is not None else np.random.default_rng()
+        worlds = self.num_hawks.shape
+        # Children per hawk of a Hawk/Hawk pair, per hawk and dove of a Hawk/Dove pair, per dove of a Dove/Dove pair
+        self.hawk_hawk_children = np.broadcast_to(offspring(np.asarray(hawk_hawk_food)), worlds)
+        self.hawk_dove_children = np.broadcast_to(offspring(np.asarray(hawk_dove_food)), worlds)
+        self.dove_hawk_children = np.broadcast_to(offspring(np.asarray(dove_hawk_food)), worlds)
+        self.dove_dove_children = np.broadcast_to(offspring(np.asarray(dove_dove_food)), worlds)
+
+    def pair_and_play(self):
+        hawk_hawk, hawk_dove, dove_dove = sample_pair_counts_batch(self.num_hawks, self.num_doves, self.rng)
+        self.num_hawks = 2 * hawk_hawk * self.hawk_hawk_children + hawk_dove * self.hawk_dove_children
+        self.num_doves = 2 * dove_dove * self.dove_dove_children + hawk_dove * self.dove_hawk_children
+
+    def run_simulation(self, rounds):
+        # (rounds, worlds) hawk and dove counts after each round
+        hawks = np.empty((rounds, *self.num_hawks.shape), dtype=np.int64)
+        doves = np.empty_like(hawks)
+        for round in range(rounds):
+            self.pair_and_play()
+            hawks[round] = self.num_hawks
+            doves[round] = self.num_doves
+        return hawks, doves
+
+if __name__ == "__main__":
+    #  Initialize and run the simulation
+    num_hawks = 50
+    num_doves = 51
+    rounds = 10
 
-simulation = Simulation(num_hawks, num_doves)
-simulation.run_simulation(rounds)
+    simulation = Simulation(num_hawks, num_doves)
+    simulation.run_simulation(rounds)
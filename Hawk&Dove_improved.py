@@ -1,5 +1,9 @@
 import random
-import matplotlib.pyplot as plt
+import numpy as np
+
+from pairing import sample_pair_counts, sample_pair_counts_batch
+from roundlog import PrintSink, RoundHistory, write_rounds
+
 class Player:
     def __init__(self, type):
         self.type = type
@@ -12,11 +16,13 @@ class Player:
         self.food += amount
 
 class Simulation:
-    def __init__(self, num_hawks, num_doves):
+    # rng is anything with the random module's interface, e.g. random.Random(seed)
+    def __init__(self, num_hawks, num_doves, rng=random):
+        self.rng = rng
         self.population = [Player('Hawk') for _ in range(num_hawks)] + [Player('Dove') for _ in range(num_doves)]
 
     def pair_and_play(self):
-        random.shuffle(self.population)
+        self.rng.shuffle(self.population)
         next_population = []
 
         for i in range(0, len(self.population), 2):
@@ -29,16 +35,16 @@ class Simulation:
             if player1.type == 'Hawk' and player2.type == 'Dove':
                 player1.gain_food(1.5)
                 player2.gain_food(0.5)
-                if random.random() < 0.5:
+                if self.rng.random() < 0.5:
                     next_population.append(Player('Dove'))
-                if player1.food >= 1.5 and random.random() < 0.5:
+                if player1.food >= 1.5 and self.rng.random() < 0.5:
                     next_population.append(Player('Hawk'))
             elif player1.type == 'Dove' and player2.type == 'Hawk':
                 player2.gain_food(1.5)
                 player1.gain_food(0.5)
-                if random.random() < 0.5:
+                if self.rng.random() < 0.5:
                     next_population.append(Player('Dove'))
-                if player2.food >= 1.5 and random.random() < 0.5:
+                if player2.food >= 1.5 and self.rng.random() < 0.5:
                     next_population.append(Player('Hawk'))
             elif player1.type == 'Dove' and player2.type == 'Dove':
                 player1.gain_food(1)
@@ -56,35 +62,117 @@ class Simulation:
 
         self.population = next_population
 
-    def run_simulation(self, rounds):
-        hawks_count=[]
-        doves_count=[]
+    def iter_rounds(self, rounds):
+        # Plays rounds rounds lazily, yielding each round's counts
         for round in range(rounds):
             self.pair_and_play()
             num_hawks = sum(1 for player in self.population if player.type == 'Hawk')
             num_doves = sum(1 for player in self.population if player.type == 'Dove')
-            hawks_count.append(num_hawks)
-            doves_count.append(num_doves)
-            print(f"Round {round + 1}: Hawks = {num_hawks}, Doves = {num_doves}")
-
-        return hawks_count,doves_count
-
-# Initialize and run the simulation
-num_hawks = 1
-num_doves = 1000
-rounds = 30
-
-simulation = Simulation(num_hawks, num_doves)
-hawk_counts,dove_counts=simulation.run_simulation(rounds)
-
-
-# Plotting the results
-plt.figure(figsize=(10, 6))
-plt.plot(range(1, rounds + 1), hawk_counts, label='Hawks', color='r')
-plt.plot(range(1, rounds + 1), dove_counts, label='Doves', color='b')
-plt.xlabel('Rounds')
-plt.ylabel('Population')
-plt.title('Hawk and Dove Population vs Rounds')
-plt.legend()
-plt.grid(True)
-plt.show()
+            yield {'round': round + 1, 'hawks': num_hawks, 'doves': num_doves}
+
+    def run_simulation(self, rounds, sinks=None, verbose=False):
+        return run_simulation(self, rounds, sinks, verbose)
+
+class AggregateSimulation:
+    # Only the hawk and dove counts are kept; each round samples how many pairs
+    # of each kind form and applies the payoffs and survival rule in bulk.
+    def __init__(self, num_hawks, num_doves, rng=None):
+        self.num_hawks = num_hawks
+        self.num_doves = num_doves
+        self.rng = rng if rng is not None else np.random.default_rng()
+
+    def pair_and_play(self):
+        hawk_hawk, hawk_dove, dove_dove = sample_pair_counts(self.num_hawks, self.num_doves, self.rng)
+        # In a Hawk/Dove pair the hawk survives and the dove does not; each
+        # pair also adds a baby dove and a baby hawk with probability 0.5.
+        # Both doves of a Dove/Dove pair survive, both hawks of a Hawk/Hawk pair die.
+        self.num_hawks = hawk_dove + int(self.rng.binomial(hawk_dove, 0.5))
+        self.num_doves = 2 * dove_dove + int(self.rng.binomial(hawk_dove, 0.5))
+
+    def iter_rounds(self, rounds):
+        for round in range(rounds):
+            self.pair_and_play()
+            yield {'round': round + 1, 'hawks': self.num_hawks, 'doves': self.num_doves}
+
+    def run_simulation(self, rounds, sinks=None, verbose=False):
+        return run_simulation(self, rounds, sinks, verbose)
+
+# Simulation's rules: a player survives the round on SURVIVAL_FOOD or more,
+# and a Hawk/Dove pair can only add a baby hawk if the hawk got HAWK_BIRTH_FOOD
+SURVIVAL_FOOD = 1
+HAWK_BIRTH_FOOD = 1.5
+
+class BatchSimulation:
+    # Many independent AggregateSimulation worlds stepped together: num_hawks
+    # and num_doves hold one count per world. The food each side of a pair gets
+    # (defaults as in Simulation) and the chance of each baby of a Hawk/Dove
+    # pair can be a scalar or one value per world, which makes sweeping the
+    # payoffs a single run.
+    def __init__(self, num_hawks, num_doves, rng=None, hawk_hawk_food=0, hawk_dove_food=1.5, dove_hawk_food=0.5,
+                 dove_dove_food=1, birth_probability=0.5):
+        self.num_hawks, self.num_doves = (np.array(counts, dtype=np.int64)
+                                          for counts in np.broadcast_arrays(num_hawks, num_doves))
+        self.rng = rng if rng is not None else np.random.default_rng()
+        worlds = self.num_hawks.shape
+        # Survivors per hawk of a Hawk/Hawk pair, per hawk and dove of a Hawk/Dove pair, per dove of a Dove/Dove pair
+        self.hawk_hawk_survivors = np.broadcast_to(np.asarray(hawk_hawk_food) >= SURVIVAL_FOOD, worlds).astype(np.int64)
+        self.hawk_dove_survivors = np.broadcast_to(np.asarray(hawk_dove_food) >= SURVIVAL_FOOD, worlds).astype(np.int64)
+        self.dove_hawk_survivors = np.broadcast_to(np.asarray(dove_hawk_food) >= SURVIVAL_FOOD, worlds).astype(np.int64)
+        self.dove_dove_survivors = np.broadcast_to(np.asarray(dove_dove_food) >= SURVIVAL_FOOD, worlds).astype(np.int64)
+        # Chance of a baby dove and of a baby hawk per Hawk/Dove pair
+        self.dove_birth_probability = np.broadcast_to(birth_probability, worlds)
+        self.hawk_birth_probability = np.where(np.asarray(hawk_dove_food) >= HAWK_BIRTH_FOOD,
+                                               self.dove_birth_probability, 0.0)
+
+    def pair_and_play(self):
+        hawk_hawk, hawk_dove, dove_dove = sample_pair_counts_batch(self.num_hawks, self.num_doves, self.rng)
+        hawk_babies = self.rng.binomial(hawk_dove, self.hawk_birth_probability)
+        dove_babies = self.rng.binomial(hawk_dove, self.dove_birth_probability)
+        self.num_hawks = 2 * hawk_hawk * self.hawk_hawk_survivors + hawk_dove * self.hawk_dove_survivors + hawk_babies
+        self.num_doves = 2 * dove_dove * self.dove_dove_survivors + hawk_dove * self.dove_hawk_survivors + dove_babies
+
+    def run_simulation(self, rounds):
+        # (rounds, worlds) hawk and dove counts after each round
+        hawks = np.empty((rounds, *self.num_hawks.shape), dtype=np.int64)
+        doves = np.empty_like(hawks)
+        for round in range(rounds):
+            self.pair_and_play()
+            hawks[round] = self.num_hawks
+            doves[round] = self.num_doves
+        return hawks, doves
+
+def run_simulation(simulation, rounds, sinks=None, verbose=False):
+    # Streams every round through sinks (see roundlog). Without sinks the counts
+    # are kept in memory and returned as (hawk_counts, dove_counts).
+    history = RoundHistory() if sinks is None else None
+    sinks = [history] if sinks is None else list(sinks)
+    if verbose:
+        sinks.append(PrintSink("Round {round}: Hawks = {hawks}, Doves = {doves}"))
+    write_rounds(simulation.iter_rounds(rounds), sinks)
+    if history is not None:
+        return history['hawks'], history['doves']
+
+def plot_results(hawk_counts, dove_counts):
+    import matplotlib.pyplot as plt
+    rounds = len(hawk_counts)
+    plt.figure(figsize=(10, 6))
+    plt.plot(range(1, rounds + 1), hawk_counts, label='Hawks', color='r')
+    plt.plot(range(1, rounds + 1), dove_counts, label='Doves', color='b')
+    plt.xlabel('Rounds')
+    plt.ylabel('Population')
+    plt.title('Hawk and Dove Population vs Rounds')
+    plt.legend()
+    plt.grid(True)
+    plt.show()
+
+if __name__ == "__main__":
+    # Initialize and run the simulation
+    num_hawks = 1
+    num_doves = 1000
+    rounds = 30
+
+    simulation = Simulation(num_hawks, num_doves)
+    hawk_counts,dove_counts=simulation.run_simulation(rounds, verbose=True)
+
+    # Plotting the results
+    plot_results(hawk_counts, dove_counts)
@@ -0,0 +1,163 @@
+import numpy as np
+
+BASES = 'ATGC'
+# Fitness contributed by each base, indexed like BASES (A=4, T=1, G=2, C=3)
+BASE_FITNESS = np.array([4, 1, 2, 3])
+
+
+# Genomes are packed 4 bases per byte, 2 bits per base, base i of a row in
+# bits 2 * (i % 4) of byte i // 4. Unused slots of the last byte hold code 0.
+BASE_SHIFTS = np.array([0, 2, 4, 6], dtype=np.uint8)
+# Total fitness of the four bases packed in each possible byte
+BYTE_FITNESS = BASE_FITNESS[(np.arange(256, dtype=np.uint8)[:, None] >> BASE_SHIFTS) & 3].sum(axis=1)
+SEQUENCE_CODES = np.zeros(256, dtype=np.uint8)
+SEQUENCE_CODES[np.frombuffer(BASES.encode(), dtype=np.uint8)] = np.arange(len(BASES))
+
+def packed_length(genome_length):
+    return -(-genome_length // 4)
+
+def pack_genomes(codes):
+    # (n, genome_length) base codes -> (n, packed_length) uint8
+    count, genome_length = codes.shape
+    padded = np.zeros((count, packed_length(genome_length) * 4), dtype=np.uint8)
+    padded[:, :genome_length] = codes
+    return np.bitwise_or.reduce(padded.reshape(count, packed_length(genome_length), 4) << BASE_SHIFTS, axis=2).astype(np.uint8)
+
+def unpack_genomes(packed, genome_length):
+    codes = (packed[:, :, None] >> BASE_SHIFTS) & 3
+    return codes.reshape(len(packed), packed.shape[1] * 4)[:, :genome_length]
+
+def encode_sequences(sequences):
+    # Genome sequence strings of equal length -> packed genomes
+    genome_length = len(sequences[0]) if sequences else 0
+    text = np.frombuffer(''.join(sequences).encode(), dtype=np.uint8)
+    return pack_genomes(SEQUENCE_CODES[text].reshape(len(sequences), genome_length))
+
+def decode_sequences(packed, genome_length):
+    letters = np.frombuffer(BASES.encode(), dtype='S1')[unpack_genomes(packed, genome_length)]
+    return [row.tobytes().decode() for row in letters]
+
+def genome_fitness(packed, genome_length):
+    # The padding slots are 'A's as far as BYTE_FITNESS is concerned
+    padding = packed_length(genome_length) * 4 - genome_length
+    return BYTE_FITNESS[packed].sum(axis=1) - padding * BASE_FITNESS[0]
+
+def mutate_genomes(packed, genome_length, mutation_probability, rng):
+    # Same rule as mutate_genome_sequence, applied to every genome at once
+    codes = unpack_genomes(packed, genome_length)
+    mutated = rng.random(codes.shape) < mutation_probability
+    codes[mutated] = rng.integers(0, len(BASES), size=np.count_nonzero(mutated), dtype=np.uint8)
+    return pack_genomes(codes)
+
+class Population:
+    # List of Agent objects that keeps its total fitness up to date as agents
+    # are added and removed
+    def __init__(self, agents=()):
+        self.agents = []
+        self.total_fitness = 0
+        self.extend(agents)
+
+    def __len__(self):
+        return len(self.agents)
+
+    def __iter__(self):
+        return iter(self.agents)
+
+    def append(self, agent):
+        self.agents.append(agent)
+        self.total_fitness += agent.fitness
+
+    def extend(self, agents):
+        for agent in agents:
+            self.append(agent)
+
+    def replace(self, survivors, removed):
+        # survivors is the new agent list, removed the agents that were dropped
+        self.agents = survivors
+        for agent in removed:
+            self.total_fitness -= agent.fitness
+
+class AgentArray:
+    # Struct-of-arrays population: agent i is (x[i], y[i], energy[i], genome[i]).
+    # genome holds one packed genome of genome_length bases per row.
+    # total_fitness is kept up to date by keep/extend instead of being
+    # re-summed every cull and breed.
+    def __init__(self, x, y, energy, genome, genome_length):
+        self.x = np.asarray(x, dtype=np.int64)
+        self.y = np.asarray(y, dtype=np.int64)
+        self.energy = np.asarray(energy, dtype=np.float64)
+        self.genome = np.asarray(genome, dtype=np.uint8).reshape(len(self.x), packed_length(genome_length))
+        self.genome_length = genome_length
+        self.fitness = genome_fitness(self.genome, genome_length)
+        self.total_fitness = int(self.fitness.sum())
+
+    @classmethod
+    def random(cls, count, width, height, energy, genome_length, rng):
+        codes = rng.integers(0, len(BASES), size=(count, genome_length), dtype=np.uint8)
+        return cls(rng.integers(0, width, size=count),
+                   rng.integers(0, height, size=count),
+                   np.full(count, energy, dtype=np.float64),
+                   pack_genomes(codes), genome_length)
+
+    def __len__(self):
+        return len(self.x)
+
+    def bases(self, position):
+        # Base code at position of every genome
+        return (self.genome[:, position // 4] >> BASE_SHIFTS[position % 4]) & 3
+
+    def move(self, width, height, rng):
+        steps = rng.integers(-1, 2, size=(2, len(self)))
+        self.x = (self.x + steps[0]) % width
+        self.y = (self.y + steps[1]) % height
+
+    def eat(self, food, energy_gain, rng=None):
+        # Bulk version of Agent.eat over a FoodGrid; returns how many agents ate
+        eaters = food.eat_all(self.x, self.y, rng)
+        self.energy[eaters] += energy_gain
+        return len(eaters)
+
+    def lose_energy(self, amount):
+        self.energy -= amount
+
+    def keep(self, mask):
+        self.total_fitness -= int(self.fitness[~mask].sum())
+        self.x = self.x[mask]
+        self.y = self.y[mask]
+        self.energy = self.energy[mask]
+        self.genome = self.genome[mask]
+        self.fitness = self.fitness[mask]
+
+    def extend(self, other):
+        self.x = np.concatenate([self.x, other.x])
+        self.y = np.concatenate([self.y, other.y])
+        self.energy = np.concatenate([self.energy, other.energy])
+        self.genome = np.concatenate([self.genome, other.genome])
+        self.fitness = np.concatenate([self.fitness, other.fitness])
+        self.total_fitness += other.total_fitness
+
+    def cull(self, energy_required_for_living, rng):
+        # Same survival rule as Simulation.cull; returns the number of dead
+        if len(self) == 0:
+            return 0
+        survival_probability = self.fitness * 20 / self.total_fitness
+        alive = (self.energy >= energy_required_for_living) & (rng.random(len(self)) <= survival_probability)
+        dead = len(self) - int(np.count_nonzero(alive))
+        self.keep(alive)
+        return dead
+
+    def breed(self, energy_required_for_reproduction, width, height, starting_energy, mutation_probability, rng):
+        # Same reproduction rule as Simulation.breed; returns the number of babies
+        if len(self) == 0:
+            return 0
+        reproduction_probability = self.fitness * 20 / self.total_fitness
+        parents = (self.energy >= energy_required_for_reproduction) & (rng.random(len(self)) <= reproduction_probability)
+        self.energy[parents] //= 2
+
+        babies = int(np.count_nonzero(parents))
+        self.extend(AgentArray(rng.integers(0, width, size=babies),
+                               rng.integers(0, height, size=babies),
+                               np.full(babies, starting_energy, dtype=np.float64),
+                               mutate_genomes(self.genome[parents], self.genome_length, mutation_probability, rng),
+                               self.genome_length))
+        return babies
@@ -1,7 +1,10 @@
 import random
 import time
-from matplotlib import pyplot as plt
-from matplotlib.lines import Line2D
+import numpy as np
+
+from agents import BASES, AgentArray, Population
+from food import food_store
+from seeding import numpy_rng
 
 # Constants
 ENV_WIDTH = 100
@@ -20,13 +23,20 @@ BASE_ENERGY_REQUIRED_FOR_REPRODUCTION = 200
 STATUS_ACTIVE = "active"
 STATUS_RESTING = "resting"
 MUTATION_PROBABILITY = 0.1
+GENOME_LENGTH = 4
+GENOME_COLOR_MAP = {
+    'A': 'blue',
+    'T': 'red',
+    'G': 'yellow',
+    'C': 'purple',
+}
 
 # Function to mutate the genome sequence
-def mutate_genome_sequence(sequence):
+def mutate_genome_sequence(sequence, rng=random):
     sequence_list = list(sequence)
     for i in range(len(sequence_list)):
-        if random.random() < MUTATION_PROBABILITY:
-            sequence_list[i] = random.choice('ATGC')
+        if rng.random() < MUTATION_PROBABILITY:
+            sequence_list[i] = rng.choice('ATGC')
     return ''.join(sequence_list)
 
 # Genome class
@@ -56,44 +66,52 @@ class Agent:
         self.energy_required_for_reproduction = BASE_ENERGY_REQUIRED_FOR_REPRODUCTION
         self.status = STATUS_ACTIVE
 
-    def move(self, env_width, env_height):
+    def move(self, env_width, env_height, rng=random):
         # Calculate the new position
-        new_x = (self.x + random.choice([-1, 0, 1])) % env_width
-        new_y = (self.y + random.choice([-1, 0, 1])) % env_height
+        new_x = (self.x + rng.choice([-1, 0, 1])) % env_width
+        new_y = (self.y + rng.choice([-1, 0, 1])) % env_height
         
         # Ensure the new position is within the environment boundaries
         self.x = max(0, min(new_x, env_width - 1))
         self.y = max(0, min(new_y, env_height - 1))
 
-    def eat(self, food_positions):
-        if (self.x, self.y) in food_positions:
+    def eat(self, food):
+        if food.take(self.x, self.y):
             self.energy += ENERGY_GAIN_FROM_FOOD
-            food_positions.remove((self.x, self.y))
 
 # Environment class
 class Environment:
-    def __init__(self, width, height):
+    def __init__(self, width, height, rng=None):
         self.width = width
         self.height = height
-        self.food_positions = []
+        self.rng = rng if rng is not None else np.random.default_rng()
+        self.food = food_store(width, height, FOOD_SPAWN_RATE)
+
+    @property
+    def food_positions(self):
+        return self.food.positions()
 
     def spawn_food(self):
-        for _ in range(FOOD_SPAWN_RATE):
-            self.food_positions.append((random.randint(0, self.width - 1), random.randint(0, self.height - 1)))
+        self.food.add_many(self.rng.integers(0, self.width, FOOD_SPAWN_RATE),
+                           self.rng.integers(0, self.height, FOOD_SPAWN_RATE))
 
 # Simulation class
 class Simulation:
-    def __init__(self, env_width, env_height, starting_players, rounds):
-        self.env = Environment(env_width, env_height)
+    def __init__(self, env_width, env_height, starting_players, rounds, rng=random):
+        self.rng = rng
+        self.env = Environment(env_width, env_height, numpy_rng(rng))
         self.players = self.init_players(starting_players)
         self.rounds = rounds
         self.graph_player_points = []
+        self.fig = None
+        self.recorder = None
 
-        # Initialize plot
+    def init_plot(self):
+        from matplotlib import pyplot as plt
         plt.ion()
         self.fig, self.ax = plt.subplots(figsize=(8, 8))
-        self.ax.set_xlim(0, ENV_WIDTH)
-        self.ax.set_ylim(0, ENV_HEIGHT)
+        self.ax.set_xlim(0, self.env.width)
+        self.ax.set_ylim(0, self.env.height)
         self.food_scatter = self.ax.scatter([], [], c='green', label='Food', marker='*')
         self.player_scatters = {}
         self.ax.legend()
@@ -102,18 +120,19 @@ class Simulation:
     def init_players(self, players):
         players_list = []
         for _ in range(players):
-            genome_sequence = ''.join(random.choices('ATGC', k=4))  # Example genome sequence
+            genome_sequence = ''.join(self.rng.choices('ATGC', k=GENOME_LENGTH))  # Example genome sequence
             genome = Genome(genome_sequence)
-            players_list.append(Agent(random.randint(0, ENV_WIDTH - 1), random.randint(0, ENV_HEIGHT - 1), genome))
-        return players_list
+            players_list.append(Agent(self.rng.randint(0, self.env.width - 1), self.rng.randint(0, self.env.height - 1), genome))
+        return Population(players_list)
 
-    def run(self):
+    def run(self, plot=True, verbose=False):
         current_round = 1
         death_count = 0
         breed_count = 0
 
         while current_round <= self.rounds and len(self.players) > 2:
-            print(f"ROUND {current_round}")
+            if verbose:
+                print(f"ROUND {current_round}")
 
             self.env.spawn_food()
             self.day_phase(current_round)
@@ -124,43 +143,52 @@ class Simulation:
             breed_count += round_player_babies
             
             player_count = self.get_count()
-            print(f"players: {player_count}")
-            print(f"Dead agents: {round_dead_players}")
-            print(f"player babies: {round_player_babies}")
-            print("----")
+            if verbose:
+                print(f"players: {player_count}")
+                print(f"Dead agents: {round_dead_players}")
+                print(f"player babies: {round_player_babies}")
+                print("----")
 
             self.graph_player_points.append(player_count)
             current_round += 1
 
-        print("=============================================================")
-        print(f"Total dead agents: {death_count}")
-        print(f"Total breeding agents: {breed_count}")
-        print(f"Total rounds completed: {current_round - 1}")
-        print(f"Total population size: {len(self.players)}")
-        print("=============================================================")
+        if verbose:
+            print("=============================================================")
+            print(f"Total dead agents: {death_count}")
+            print(f"Total breeding agents: {breed_count}")
+            print(f"Total rounds completed: {current_round - 1}")
+            print(f"Total population size: {len(self.players)}")
+            print("=============================================================")
 
-        self.plot_results()
+        if plot:
+            self.plot_results()
+
+    def record(self, recorder):
+        # Runs without the live plot, handing every tick to recorder (see render.py)
+        self.recorder = recorder
+        self.run(plot=False)
+        recorder.on_finish(self)
 
     def day_phase(self, round):
         start_time = 1
         for player in self.players:
-            boundary_position = random.choice([
-                (random.randint(0, self.env.width - 1), 0),  # Top boundary
-                (random.randint(0, self.env.width - 1), self.env.height - 1),  # Bottom boundary
-                (0, random.randint(0, self.env.height - 1)),  # Left boundary
-                (self.env.width - 1, random.randint(0, self.env.height - 1))  # Right boundary
+            boundary_position = self.rng.choice([
+                (self.rng.randint(0, self.env.width - 1), 0),  # Top boundary
+                (self.rng.randint(0, self.env.width - 1), self.env.height - 1),  # Bottom boundary
+                (0, self.rng.randint(0, self.env.height - 1)),  # Left boundary
+                (self.env.width - 1, self.rng.randint(0, self.env.height - 1))  # Right boundary
             ])
             player.x, player.y = boundary_position
         while True:
             for player in self.players:
-                player.move(self.env.width, self.env.height)
-                player.eat(self.env.food_positions)
+                player.move(self.env.width, self.env.height, self.rng)
+                player.eat(self.env.food)
                 player.energy -= ENERGY_LOSS_PER_DAY / ROUND_DURATION
             self.update_plot(round, start_time)
             start_time += 1
             if start_time >= ROUND_DURATION:
                 break
-        self.env.food_positions = []
+        self.env.food.clear()
 
     def night_phase(self):
         for night in range(NIGHT_LENGTH):
@@ -170,30 +198,32 @@ class Simulation:
     def cull(self):
         dead_players = 0
         new_players = []
-        total_fitness = sum(player.fitness for player in self.players)
+        removed_players = []
+        total_fitness = self.players.total_fitness
 
         for player in self.players:
             survival_probability = player.fitness * 20 / total_fitness
-            if player.energy < player.energy_required_for_living or random.random() > survival_probability:
+            if player.energy < player.energy_required_for_living or self.rng.random() > survival_probability:
                 dead_players += 1
+                removed_players.append(player)
             else:
                 new_players.append(player)
-        self.players = new_players
+        self.players.replace(new_players, removed_players)
         return dead_players
 
     def breed(self):
         player_babies = 0
         new_players = []
 
-        total_fitness = sum(player.fitness for player in self.players)
+        total_fitness = self.players.total_fitness
 
         for player in self.players:
             reproduction_probability = player.fitness * 20 / total_fitness
-            if player.energy >= player.energy_required_for_reproduction and random.random() <= reproduction_probability:
+            if player.energy >= player.energy_required_for_reproduction and self.rng.random() <= reproduction_probability:
                 player.energy //= 2
-                genome_sequence = mutate_genome_sequence(player.genome.sequence)
+                genome_sequence = mutate_genome_sequence(player.genome.sequence, self.rng)
                 genome = Genome(genome_sequence)
-                new_players.append(Agent(random.randint(0, ENV_WIDTH - 1), random.randint(0, ENV_HEIGHT - 1), genome))
+                new_players.append(Agent(self.rng.randint(0, self.env.width - 1), self.rng.randint(0, self.env.height - 1), genome))
                 player_babies += 1
 
         self.players.extend(new_players)
@@ -202,23 +232,28 @@ class Simulation:
     def get_count(self):
         return len(self.players)
 
-    def update_plot(self, round, duration):
-        food_x, food_y = zip(*self.env.food_positions) if self.env.food_positions else ([], [])
-        
-        genome_color_map = {
-            'A': 'blue',
-            'T': 'red',
-            'G': 'yellow',
-            'C': 'purple',
-        }
-        
+    def player_positions_by_color(self):
         player_positions = {}
         for player in self.players:
-            color = genome_color_map[player.genome.sequence[0]]  # Use the first character of the genome sequence for color
+            color = GENOME_COLOR_MAP[player.genome.sequence[0]]  # Use the first character of the genome sequence for color
             if color not in player_positions:
                 player_positions[color] = ([], [])
             player_positions[color][0].append(player.x)
             player_positions[color][1].append(player.y)
+        return player_positions
+
+    def update_plot(self, round, duration):
+        if self.recorder is not None:
+            self.recorder.on_tick(self, round, duration)
+            return
+        from matplotlib.lines import Line2D
+        if self.fig is None:
+            self.init_plot()
+
+        food_positions = self.env.food_positions
+        food_x, food_y = zip(*food_positions) if food_positions else ([], [])
+
+        player_positions = self.player_positions_by_color()
 
         self.food_scatter.set_offsets(list(zip(food_x, food_y)))
         
@@ -240,14 +275,62 @@ class Simulation:
         self.ax.legend(handles=[self.food_scatter] + [Line2D([0], [0], marker='o', color='w', label=f'Players ({color})', markerfacecolor=color) for color in player_positions.keys()])
 
     def plot_results(self):
+        from matplotlib import pyplot as plt
         plt.plot(self.graph_player_points, label="players")
         plt.xlabel("Rounds")
         plt.ylabel("Population")
         plt.legend()
         plt.show()
 
+# Simulation backed by an AgentArray: every phase runs as whole-population
+# array operations instead of a Python loop over Agent objects
+class ArraySimulation(Simulation):
+    def __init__(self, env_width, env_height, starting_players, rounds, rng=None):
+        rng = rng if rng is not None else np.random.default_rng()
+        super().__init__(env_width, env_height, starting_players, rounds, rng=rng)
+
+    def init_players(self, players):
+        return AgentArray.random(players, self.env.width, self.env.height, STARTING_ENERGY, GENOME_LENGTH, self.rng)
+
+    def day_phase(self, round):
+        # Every player starts the day on a random point of a random boundary
+        count = len(self.players)
+        side = self.rng.integers(0, 4, size=count)
+        along_x = self.rng.integers(0, self.env.width, size=count)
+        along_y = self.rng.integers(0, self.env.height, size=count)
+        self.players.x = np.select([side == 2, side == 3], [0, self.env.width - 1], along_x)
+        self.players.y = np.select([side == 0, side == 1], [0, self.env.height - 1], along_y)
+
+        for start_time in range(1, ROUND_DURATION):
+            self.players.move(self.env.width, self.env.height, self.rng)
+            self.players.eat(self.env.food, ENERGY_GAIN_FROM_FOOD)
+            self.players.lose_energy(ENERGY_LOSS_PER_DAY / ROUND_DURATION)
+            self.update_plot(round, start_time)
+        self.env.food.clear()
+
+    def night_phase(self):
+        for night in range(NIGHT_LENGTH):
+            self.players.lose_energy(ENERGY_LOSS_PER_NIGHT / NIGHT_LENGTH)
+
+    def cull(self):
+        return self.players.cull(BASE_ENERGY_REQUIRED_FOR_LIVING, self.rng)
+
+    def breed(self):
+        return self.players.breed(BASE_ENERGY_REQUIRED_FOR_REPRODUCTION, self.env.width, self.env.height,
+                                  STARTING_ENERGY, MUTATION_PROBABILITY, self.rng)
+
+    def player_positions_by_color(self):
+        first_base = self.players.bases(0)
+        player_positions = {}
+        for code, base in enumerate(BASES):
+            on_base = first_base == code
+            if on_base.any():
+                player_positions[GENOME_COLOR_MAP[base]] = (self.players.x[on_base], self.players.y[on_base])
+        return player_positions
+
 if __name__ == "__main__":
     simulation = Simulation(ENV_WIDTH, ENV_HEIGHT, STARTING_PLAYERS, ROUNDS)
-    simulation.run()
+    simulation.run(verbose=True)
+    from matplotlib import pyplot as plt
     plt.ioff()  # Turn off interactive mode after simulation is done
     plt.show()
@@ -1,4 +1,3 @@
-import matplotlib.pyplot as plt
 import numpy as np
 class Player:
     def __init__(self, name, size, speed, strategy):
@@ -8,11 +7,12 @@ class Player:
         self.strategy = strategy  # Pure strategy: {'action': utility}, Mixed strategy: {'action': probability}
         self.utility = 0  # Total utility gained by the player
     
-    def choose_action(self):
+    # rng is np.random or a numpy Generator
+    def choose_action(self, rng=np.random):
         if isinstance(self.strategy, dict):
             # Mixed strategy
             actions, probabilities = zip(*self.strategy.items())
-            return np.random.choice(actions, p=probabilities)
+            return rng.choice(actions, p=probabilities)
         else:
             # Pure strategy
             return self.strategy
@@ -20,18 +20,17 @@ class Game:
     def __init__(self, payoff_matrix):
         self.payoff_matrix = payoff_matrix  # A dictionary with keys as (action1, action2) and values as (utility1, utility2)
     
-    def play(self, player1, player2):
-        action1 = player1.choose_action()
-        action2 = player2.choose_action()
+    def play(self, player1, player2, rng=np.random):
+        action1 = player1.choose_action(rng)
+        action2 = player2.choose_action(rng)
         utility1, utility2 = self.payoff_matrix[(action1, action2)]
         player1.utility += utility1
         player2.utility += utility2
         return action1, action2, utility1, utility2
-import matplotlib.pyplot as plt
-import numpy as np
 
 class Simulation:
-    def __init__(self, players, game, num_rounds):
+    def __init__(self, players, game, num_rounds, rng=np.random):
+        self.rng = rng
         self.players = players
         self.game = game
         self.num_rounds = num_rounds
@@ -42,11 +41,12 @@ class Simulation:
             for i, player1 in enumerate(self.players):
                 for j, player2 in enumerate(self.players):
                     if i != j:
-                        self.game.play(player1, player2)
+                        self.game.play(player1, player2, self.rng)
             for player in self.players:
                 self.utilities_over_time[player.name].append(player.utility)
     
     def plot_utilities(self):
+        import matplotlib.pyplot as plt
         for player_name, utilities in self.utilities_over_time.items():
             plt.plot(range(self.num_rounds), utilities, label=player_name)
         plt.xlabel('Rounds')
@@ -55,25 +55,91 @@ class Simulation:
         plt.legend()
         plt.show()
 
-        
-# Define players
-player1 = Player('Player 1', size=1, speed=1, strategy={'A': 0.5, 'B': 0.5})  # Mixed strategy
-player2 = Player('Player 2', size=1, speed=1, strategy='A')  # Pure strategy
+class MatrixGame:
+    # Matrix form of a Game: action k is actions[k] and payoffs[a1, a2] holds
+    # (utility1, utility2) for row action a1 against column action a2
+    def __init__(self, actions, payoffs):
+        self.actions = list(actions)
+        self.payoffs = np.asarray(payoffs)
+
+    @classmethod
+    def from_game(cls, game):
+        actions = sorted({action for pair in game.payoff_matrix for action in pair})
+        payoffs = np.array([[game.payoff_matrix[(action1, action2)] for action2 in actions] for action1 in actions])
+        return cls(actions, payoffs)
+
+    def strategy_matrix(self, players):
+        # (players, actions) probability of each player picking each action
+        probabilities = np.zeros((len(players), len(self.actions)))
+        index = {action: k for k, action in enumerate(self.actions)}
+        for i, player in enumerate(players):
+            if isinstance(player.strategy, dict):
+                for action, probability in player.strategy.items():
+                    probabilities[i, index[action]] = probability
+            else:
+                probabilities[i, index[player.strategy]] = 1
+        return probabilities
+
+class MatrixSimulation(Simulation):
+    # Same round-robin as Simulation (every ordered pair of distinct players
+    # plays once per round, both drawing a fresh action), but all the matches
+    # of block_size row players are drawn with one rng.random call and scored
+    # by indexing the payoff array. rng is a numpy Generator.
+    def __init__(self, players, game, num_rounds, rng=None, block_size=256):
+        super().__init__(players, game, num_rounds, rng if rng is not None else np.random.default_rng())
+        self.matrix_game = game if isinstance(game, MatrixGame) else MatrixGame.from_game(game)
+        # An action is the number of cumulative probabilities its uniform draw exceeds
+        self.thresholds = np.cumsum(self.matrix_game.strategy_matrix(players), axis=1)[:, :-1]
+        self.block_size = block_size
+
+    def draw_actions(self, rows, columns, draws):
+        # draws is uniform (len(rows), len(columns), 2); returns both players' actions
+        row_actions = (draws[:, :, 0, None] >= self.thresholds[rows, None, :]).sum(axis=2)
+        column_actions = (draws[:, :, 1, None] >= self.thresholds[None, columns, :]).sum(axis=2)
+        return row_actions, column_actions
+
+    def play_round(self):
+        # Utility every player gains in one round
+        count = len(self.players)
+        payoffs = self.matrix_game.payoffs
+        gains = np.zeros(count, dtype=np.result_type(payoffs.dtype, np.int64))
+        columns = np.arange(count)
+        for start in range(0, count, self.block_size):
+            rows = np.arange(start, min(start + self.block_size, count))
+            row_actions, column_actions = self.draw_actions(rows, columns, self.rng.random((len(rows), count, 2)))
+            outcome = payoffs[row_actions, column_actions]
+            outcome[np.arange(len(rows)), rows] = 0  # nobody plays themselves
+            gains[rows] += outcome[:, :, 0].sum(axis=1)
+            gains += outcome[:, :, 1].sum(axis=0)
+        return gains
+
+    def run(self):
+        for _ in range(self.num_rounds):
+            gains = self.play_round()
+            for player, gain in zip(self.players, gains.tolist()):
+                player.utility += gain
+                self.utilities_over_time[player.name].append(player.utility)
+
+
+if __name__ == "__main__":
+    # Define players
+    player1 = Player('Player 1', size=1, speed=1, strategy={'A': 0.5, 'B': 0.5})  # Mixed strategy
+    player2 = Player('Player 2', size=1, speed=1, strategy='A')  # Pure strategy
 
-# Define the payoff matrix
-payoff_matrix = {
-    ('A', 'A'): (3, 3),
-    ('A', 'B'): (0, 5),
-    ('B', 'A'): (5, 0),
-    ('B', 'B'): (1, 1),
-}
+    # Define the payoff matrix
+    payoff_matrix = {
+        ('A', 'A'): (3, 3),
+        ('A', 'B'): (0, 5),
+        ('B', 'A'): (5, 0),
+        ('B', 'B'): (1, 1),
+    }
 
-# Create the game
-game = Game(payoff_matrix)
+    # Create the game
+    game = Game(payoff_matrix)
 
-# Run the simulation
-simulation = Simulation([player1, player2], game, num_rounds=100)
-simulation.run()
+    # Run the simulation
+    simulation = Simulation([player1, player2], game, num_rounds=100)
+    simulation.run()
 
-# Plot the results
-simulation.plot_utilities()
+    # Plot the results
+    simulation.plot_utilities()
@@ -0,0 +1,217 @@
+import argparse
+import json
+import platform
+import random
+import subprocess
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+from script_loader import load_script
+
+# Each case builds a simulation of a given population size and grid side, and
+# lists the phases of one round in the order they run. Phases are called
+# with the simulation and the 1-based round number.
+
+def hawk_dove_case(filename, engine):
+    def setup(size, grid, seed):
+        module = load_script(filename)
+        rng = random.Random(seed) if engine == 'Simulation' else np.random.default_rng(seed)
+        return getattr(module, engine)(size // 2, size - size // 2, rng)
+    return setup, [('pair_and_play', lambda simulation, round: simulation.pair_and_play())]
+
+def batch_case(filename, world_size=100):
+    def setup(size, grid, seed):
+        module = load_script(filename)
+        worlds = max(size // world_size, 1)
+        return module.BatchSimulation(np.full(worlds, world_size // 2), world_size - world_size // 2,
+                                      np.random.default_rng(seed))
+    return setup, [('pair_and_play', lambda simulation, round: simulation.pair_and_play())]
+
+def v3_case(backend='python'):
+    def setup(size, grid, seed):
+        v3 = load_script('hawk&Dove_v3.py')
+        return v3.Simulation(grid, grid, size - size // 2, size // 2, 1, rng=random.Random(seed), backend=backend)
+    return setup, [
+        ('spawn_food', lambda simulation, round: simulation.env.spawn_food()),
+        ('day_phase', lambda simulation, round: simulation.day_phase()),
+        ('night_phase', lambda simulation, round: simulation.night_phase()),
+        ('cull', lambda simulation, round: simulation.cull()),
+        ('breed', lambda simulation, round: simulation.breed()),
+    ]
+
+def natural_selection_case(filename, engine, backend=None, workers=None):
+    def setup(size, grid, seed):
+        module = load_script(filename)
+        rng = random.Random(seed) if engine == 'Simulation' else np.random.default_rng(seed)
+        options = {'backend': backend} if backend else {}
+        if workers:
+            options['workers'] = workers
+        return getattr(module, engine)(grid, grid, size, 1, rng=rng, **options)
+    if filename == 'naturalselection.py':
+        day_phase = lambda simulation, round: simulation.day_phase(round)
+    else:
+        day_phase = lambda simulation, round: simulation.day_phase()
+    return setup, [
+        ('spawn_food', lambda simulation, round: simulation.env.spawn_food()),
+        ('day_phase', day_phase),
+        ('night_phase', lambda simulation, round: simulation.night_phase()),
+        ('cull', lambda simulation, round: simulation.cull()),
+        ('breed', lambda simulation, round: simulation.breed()),
+    ]
+
+def basic_game_case(engine):
+    def setup(size, grid, seed):
+        basic_game = load_script('basic_game.py')
+        rng = np.random.default_rng(seed)
+        players = [basic_game.Player(f'Player {i}', size=1, speed=1, strategy={'A': 0.5, 'B': 0.5} if i % 2 else 'A')
+                   for i in range(size)]
+        payoff_matrix = {('A', 'A'): (3, 3), ('A', 'B'): (0, 5), ('B', 'A'): (5, 0), ('B', 'B'): (1, 1)}
+        return getattr(basic_game, engine)(players, basic_game.Game(payoff_matrix), num_rounds=1, rng=rng)
+    return setup, [('run', lambda simulation, round: simulation.run())]
+
+# name -> (case, default population sizes)
+CASES = {
+    'Hawk&Dove.Simulation': (hawk_dove_case('Hawk&Dove.py', 'Simulation'), [10**2, 10**3, 10**4, 10**5, 10**6]),
+    'Hawk&Dove.ArraySimulation': (hawk_dove_case('Hawk&Dove.py', 'ArraySimulation'),
+                                  [10**2, 10**3, 10**4, 10**5, 10**6]),
+    'Hawk&Dove.AggregateSimulation': (hawk_dove_case('Hawk&Dove.py', 'AggregateSimulation'),
+                                      [10**2, 10**3, 10**4, 10**5, 10**6]),
+    'Hawk&Dove.BatchSimulation': (batch_case('Hawk&Dove.py'), [10**2, 10**3, 10**4, 10**5, 10**6]),
+    'Hawk&Dove_improved.Simulation': (hawk_dove_case('Hawk&Dove_improved.py', 'Simulation'),
+                                      [10**2, 10**3, 10**4, 10**5, 10**6]),
+    'Hawk&Dove_improved.AggregateSimulation': (hawk_dove_case('Hawk&Dove_improved.py', 'AggregateSimulation'),
+                                               [10**2, 10**3, 10**4, 10**5, 10**6]),
+    'Hawk&Dove_improved.BatchSimulation': (batch_case('Hawk&Dove_improved.py'), [10**2, 10**3, 10**4, 10**5, 10**6]),
+    'hawk&Dove_v3.Simulation': (v3_case(), [10**2, 10**3, 10**4, 10**5]),
+    'hawk&Dove_v3.Simulation/numpy': (v3_case('numpy'), [10**2, 10**3, 10**4, 10**5]),
+    'hawk&Dove_v3.Simulation/auto': (v3_case('auto'), [10**2, 10**3, 10**4, 10**5]),
+    'hawk&Dove_v3.Simulation/events': (v3_case('events'), [10**2, 10**3, 10**4, 10**5]),
+    'naturalselection.Simulation': (natural_selection_case('naturalselection.py', 'Simulation'), [10**2, 10**3]),
+    'naturalselection.Simulation/numpy': (natural_selection_case('naturalselection.py', 'Simulation', 'numpy'),
+                                          [10**2, 10**3]),
+    'naturalselection.ArraySimulation': (natural_selection_case('naturalselection.py', 'ArraySimulation'),
+                                         [10**2, 10**3, 10**4, 10**5]),
+    'naturalselection.ArraySimulation/auto': (natural_selection_case('naturalselection.py', 'ArraySimulation', 'auto'),
+                                              [10**2, 10**3, 10**4, 10**5]),
+    'naturalselection.ShardedSimulation': (natural_selection_case('naturalselection.py', 'ShardedSimulation'),
+                                           [10**4, 10**5, 10**6]),
+    'naturalselection.ShardedSimulation/4': (natural_selection_case('naturalselection.py', 'ShardedSimulation',
+                                                                    workers=4),
+                                             [10**4, 10**5, 10**6]),
+    'with_animation.Simulation': (natural_selection_case('with_animation.py', 'Simulation'), [10**2, 10**3, 10**4]),
+    'with_animation.ArraySimulation': (natural_selection_case('with_animation.py', 'ArraySimulation'),
+                                       [10**2, 10**3, 10**4, 10**5, 10**6]),
+    'with_animation.ArraySimulation/events': (natural_selection_case('with_animation.py', 'ArraySimulation', 'events'),
+                                              [10**2, 10**3, 10**4, 10**5, 10**6]),
+    'basic_game.Simulation': (basic_game_case('Simulation'), [10**2]),
+    'basic_game.MatrixSimulation': (basic_game_case('MatrixSimulation'), [10**2, 10**3, 10**4]),
+}
+
+def population(simulation):
+    for name in ('population', 'agents', 'players'):
+        if hasattr(simulation, name):
+            return len(getattr(simulation, name))
+    return int(np.sum(simulation.num_hawks + simulation.num_doves))
+
+def measure(setup, phases, size, grid, rounds, seed, trace_memory):
+    # Runs rounds rounds of every phase and returns {phase: (seconds, agent-visits, peak bytes)}
+    totals = {name: [0.0, 0, 0] for name, _ in phases}
+    simulation = setup(size, grid, seed)
+    if trace_memory:
+        tracemalloc.start()
+    for round in range(1, rounds + 1):
+        for name, phase in phases:
+            agents = population(simulation)
+            if trace_memory:
+                tracemalloc.reset_peak()
+                baseline = tracemalloc.get_traced_memory()[0]
+            start = time.perf_counter()
+            phase(simulation, round)
+            totals[name][0] += time.perf_counter() - start
+            totals[name][1] += agents
+            if trace_memory:
+                totals[name][2] = max(totals[name][2], tracemalloc.get_traced_memory()[1] - baseline)
+    if trace_memory:
+        tracemalloc.stop()
+    if hasattr(simulation, 'close'):
+        simulation.close()
+    return totals
+
+def run_benchmarks(names, sizes, grids, rounds, seed, trace_memory=True):
+    results = []
+    for name in names:
+        (setup, phases), default_sizes = CASES[name]
+        for size in sizes or default_sizes:
+            for grid in grids:
+                timings = measure(setup, phases, size, grid, rounds, seed, trace_memory=False)
+                memory = measure(setup, phases, size, grid, rounds, seed, trace_memory=True) if trace_memory else None
+                for phase, (seconds, agents, _) in timings.items():
+                    result = {
+                        'case': name,
+                        'phase': phase,
+                        'population': size,
+                        'grid': grid,
+                        'rounds': rounds,
+                        'seconds': seconds,
+                        'agents_per_second': agents / seconds if seconds > 0 else None,
+                        'peak_memory_bytes': memory[phase][2] if memory else None,
+                    }
+                    results.append(result)
+                    print(f"{name:40} {phase:14} n={size:<8} grid={grid:<6} {seconds:10.4f}s "
+                          f"{result['agents_per_second'] or 0:14.0f} agents/s", file=sys.stderr)
+    return results
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def compare(results, baseline, threshold):
+    # Phases that got more than threshold times slower than in the baseline run
+    key = lambda result: (result['case'], result['phase'], result['population'], result['grid'], result['rounds'])
+    previous = {key(result): result for result in baseline['results']}
+    slowdowns = []
+    for result in results:
+        old = previous.get(key(result))
+        if old and old['seconds'] > 0 and result['seconds'] > old['seconds'] * threshold:
+            slowdowns.append((result, result['seconds'] / old['seconds']))
+    return slowdowns
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Time every simulation phase at scaled population sizes.')
+    parser.add_argument('--cases', nargs='*', default=list(CASES), choices=list(CASES))
+    parser.add_argument('--sizes', nargs='*', type=int, help='population sizes (default: per-case)')
+    parser.add_argument('--grids', nargs='*', type=int, default=[100], help='grid side lengths for spatial cases')
+    parser.add_argument('--rounds', type=int, default=1)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--no-memory', action='store_true', help='skip the tracemalloc pass')
+    parser.add_argument('--output', help='write results as JSON to this file')
+    parser.add_argument('--compare', help='JSON file from an earlier run to check for slowdowns')
+    parser.add_argument('--threshold', type=float, default=1.25)
+    args = parser.parse_args()
+
+    results = run_benchmarks(args.cases, args.sizes, args.grids, args.rounds, args.seed, not args.no_memory)
+    report = {
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'results': results,
+    }
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(report, file, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+
+    if args.compare:
+        with open(args.compare) as file:
+            slowdowns = compare(results, json.load(file), args.threshold)
+        for result, ratio in slowdowns:
+            print(f"SLOWER {ratio:.2f}x: {result['case']} {result['phase']} n={result['population']} "
+                  f"grid={result['grid']}", file=sys.stderr)
+        if slowdowns:
+            sys.exit(1)
@@ -0,0 +1,61 @@
+import json
+import os
+import random
+import threading
+
+import numpy as np
+
+# A checkpoint is an uncompressed .npz of plain numeric arrays; anything that
+# isn't naturally an array (settings, counters, RNG states) goes into a JSON
+# document stored as a uint8 array under 'meta'. Nothing is pickled.
+
+def encode_json(document):
+    return np.frombuffer(json.dumps(document).encode(), dtype=np.uint8)
+
+def decode_json(array):
+    return json.loads(array.tobytes().decode())
+
+def rng_state(rng):
+    # JSON-friendly state of a numpy Generator, a random.Random or the random module
+    if isinstance(rng, np.random.Generator):
+        return {'kind': 'numpy', 'state': rng.bit_generator.state}
+    version, internal, gauss_next = rng.getstate()
+    return {'kind': 'python', 'version': version, 'internal': list(internal), 'gauss_next': gauss_next}
+
+def restore_rng(state):
+    if state['kind'] == 'numpy':
+        bit_generator = getattr(np.random, state['state']['bit_generator'])()
+        bit_generator.state = state['state']
+        return np.random.Generator(bit_generator)
+    rng = random.Random()
+    rng.setstate((state['version'], tuple(state['internal']), state['gauss_next']))
+    return rng
+
+def load(path):
+    with np.load(path, allow_pickle=False) as arrays:
+        arrays = dict(arrays)
+    return decode_json(arrays.pop('meta')), arrays
+
+class CheckpointWriter:
+    # Writes snapshots on a background thread so the caller only pays for
+    # taking the snapshot. Files are written next to path and renamed into
+    # place, so an interrupted write never leaves a half-written checkpoint.
+    def __init__(self, path):
+        self.path = path
+        self.thread = None
+
+    def write(self, meta, arrays):
+        self.wait()
+        self.thread = threading.Thread(target=self._write, args=(meta, arrays), daemon=True)
+        self.thread.start()
+
+    def wait(self):
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+    def _write(self, meta, arrays):
+        temporary_path = self.path + '.tmp'
+        with open(temporary_path, 'wb') as file:
+            np.savez(file, meta=encode_json(meta), **arrays)
+        os.replace(temporary_path, self.path)
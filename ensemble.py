@@ -0,0 +1,206 @@
+import csv
+import os
+import sys
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from functools import partial
+from statistics import NormalDist
+
+import numpy as np
+
+from script_loader import load_script
+from seeding import child_seeds, numpy_rng, python_rng
+
+# Runs many replicates of a simulation and keeps only per-round running
+# statistics, so memory is O(rounds) however many replicates are run.
+# A job is a picklable callable (rounds, seed_sequence) -> {series: counts per
+# round}; a replicate that dies out early simply contributes fewer rounds.
+
+class P2Quantile:
+    # P-square streaming estimate (Jain & Chlamtac) of quantile p for every
+    # round at once: five markers per round, updated as observations arrive.
+    # Until a round has five observations they are kept and used directly.
+    def __init__(self, rounds, p):
+        self.p = p
+        self.heights = np.zeros((rounds, 5))
+        self.positions = np.tile(np.arange(1.0, 6.0), (rounds, 1))
+        self.desired = np.tile(np.array([1, 1 + 2 * p, 1 + 4 * p, 3 + 2 * p, 5]), (rounds, 1))
+        self.increments = np.array([0, p / 2, p, (1 + p) / 2, 1])
+
+    def add(self, rows, values, counts):
+        # counts are the rows' observation counts including values
+        early = counts <= 5
+        self.heights[rows[early], counts[early] - 1] = values[early]
+        starting = rows[counts == 5]
+        self.heights[starting] = np.sort(self.heights[starting], axis=1)
+        self.update(rows[counts > 5], values[counts > 5])
+
+    def update(self, rows, x):
+        q = self.heights[rows]
+        n = self.positions[rows]
+        q[:, 0] = np.minimum(q[:, 0], x)
+        q[:, 4] = np.maximum(q[:, 4], x)
+        cell = np.clip((x[:, None] >= q[:, 1:4]).sum(axis=1), 0, 3)
+        n += np.arange(5) > cell[:, None]
+        desired = self.desired[rows] + self.increments
+
+        for i in (1, 2, 3):
+            d = desired[:, i] - n[:, i]
+            step = np.where((d >= 1) & (n[:, i + 1] - n[:, i] > 1), 1,
+                            np.where((d <= -1) & (n[:, i - 1] - n[:, i] < -1), -1, 0))
+            moving = step != 0
+            if not moving.any():
+                continue
+            s = step[moving]
+            q_low, q_mid, q_high = q[moving, i - 1], q[moving, i], q[moving, i + 1]
+            n_low, n_mid, n_high = n[moving, i - 1], n[moving, i], n[moving, i + 1]
+            parabolic = q_mid + s / (n_high - n_low) * ((n_mid - n_low + s) * (q_high - q_mid) / (n_high - n_mid)
+                                                       + (n_high - n_mid - s) * (q_mid - q_low) / (n_mid - n_low))
+            linear = np.where(s > 0, q_mid + (q_high - q_mid) / (n_high - n_mid), q_mid - (q_low - q_mid) / (n_low - n_mid))
+            q[moving, i] = np.where((q_low < parabolic) & (parabolic < q_high), parabolic, linear)
+            n[moving, i] += s
+
+        self.heights[rows] = q
+        self.positions[rows] = n
+        self.desired[rows] = desired
+
+    def estimate(self, counts):
+        result = self.heights[:, 2].copy()
+        for row in np.flatnonzero((counts > 0) & (counts < 5)):
+            result[row] = np.quantile(self.heights[row, :counts[row]], self.p)
+        result[counts == 0] = np.nan
+        return result
+
+class RoundStats:
+    # Welford running mean/variance plus streaming quantiles for one series
+    def __init__(self, rounds, quantiles=(0.05, 0.5, 0.95)):
+        self.count = np.zeros(rounds, dtype=np.int64)
+        self.mean = np.zeros(rounds)
+        self.m2 = np.zeros(rounds)
+        self.quantiles = [P2Quantile(rounds, p) for p in quantiles]
+
+    def add(self, trajectory):
+        values = np.asarray(trajectory, dtype=np.float64)[:len(self.count)]
+        rows = np.arange(len(values))
+        self.count[rows] += 1
+        delta = values - self.mean[rows]
+        self.mean[rows] += delta / self.count[rows]
+        self.m2[rows] += delta * (values - self.mean[rows])
+        for quantile in self.quantiles:
+            quantile.add(rows, values, self.count[rows])
+
+    def variance(self):
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return np.where(self.count > 1, self.m2 / (self.count - 1), np.nan)
+
+    def ci_halfwidth(self, confidence=0.95):
+        z = NormalDist().inv_cdf(0.5 + confidence / 2)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return z * np.sqrt(self.variance() / self.count)
+
+    def summary(self, confidence=0.95):
+        halfwidth = self.ci_halfwidth(confidence)
+        result = {
+            'count': self.count.copy(),
+            'mean': self.mean.copy(),
+            'variance': self.variance(),
+            'ci_low': self.mean - halfwidth,
+            'ci_high': self.mean + halfwidth,
+        }
+        for quantile in self.quantiles:
+            result[f'q{quantile.p:g}'] = quantile.estimate(self.count)
+        return result
+
+class Ensemble:
+    def __init__(self, rounds, quantiles=(0.05, 0.5, 0.95), confidence=0.95):
+        self.rounds = rounds
+        self.quantiles = quantiles
+        self.confidence = confidence
+        self.series = {}
+        self.replicates = 0
+
+    def add(self, trajectories):
+        for name, trajectory in trajectories.items():
+            if name not in self.series:
+                self.series[name] = RoundStats(self.rounds, self.quantiles)
+            self.series[name].add(trajectory)
+        self.replicates += 1
+
+    def ci_width(self):
+        # Widest confidence interval over every round of every series; rounds
+        # fewer than two replicates reached are ignored
+        widths = [2 * stats.ci_halfwidth(self.confidence)[stats.count > 1] for stats in self.series.values()]
+        widths = np.concatenate(widths) if widths else np.array([])
+        return float(widths.max()) if len(widths) else np.inf
+
+    def summary(self):
+        return {name: stats.summary(self.confidence) for name, stats in self.series.items()}
+
+def run_ensemble(job, rounds, replicates, seed=0, max_workers=1, ci_width=None, min_replicates=10,
+                 quantiles=(0.05, 0.5, 0.95), confidence=0.95):
+    # Runs up to replicates replicates of job, stopping early once every
+    # per-round confidence interval is narrower than ci_width (after at least
+    # min_replicates). Replicates are aggregated in order, so the result for a
+    # given seed does not depend on max_workers.
+    ensemble = Ensemble(rounds, quantiles, confidence)
+    seeds = child_seeds(seed, replicates)
+
+    def done():
+        return (ci_width is not None and ensemble.replicates >= min_replicates
+                and ensemble.ci_width() < ci_width)
+
+    if max_workers == 1:
+        for seed_sequence in seeds:
+            ensemble.add(job(rounds, seed_sequence))
+            if done():
+                break
+        return ensemble
+
+    workers = max_workers or os.cpu_count()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        in_flight = {}
+        finished = {}
+        next_to_submit = 0
+        while ensemble.replicates < replicates and not done():
+            while next_to_submit < replicates and len(in_flight) < 2 * workers:
+                in_flight[pool.submit(job, rounds, seeds[next_to_submit])] = next_to_submit
+                next_to_submit += 1
+            completed, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in completed:
+                finished[in_flight.pop(future)] = future.result()
+            while ensemble.replicates in finished and not done():
+                ensemble.add(finished.pop(ensemble.replicates))
+        for future in in_flight:
+            future.cancel()
+    return ensemble
+
+# Jobs for the scripts; bind their parameters with functools.partial
+
+def hawk_dove_improved_job(rounds, seed_sequence, num_hawks=1, num_doves=1000, engine='AggregateSimulation'):
+    module = load_script('Hawk&Dove_improved.py')
+    rng = python_rng(seed_sequence) if engine == 'Simulation' else numpy_rng(seed_sequence)
+    hawks, doves = getattr(module, engine)(num_hawks, num_doves, rng).run_simulation(rounds)
+    return {'hawks': hawks, 'doves': doves}
+
+def natural_selection_job(rounds, seed_sequence, starting_players=50, engine='ArraySimulation'):
+    module = load_script('naturalselection.py')
+    rng = python_rng(seed_sequence) if engine == 'Simulation' else numpy_rng(seed_sequence)
+    simulation = getattr(module, engine)(module.ENV_WIDTH, module.ENV_HEIGHT, starting_players, rounds, rng=rng)
+    simulation.run()
+    return {'players': simulation.graph_player_points}
+
+def write_csv(ensemble, file):
+    summary = ensemble.summary()
+    writer = None
+    for name, columns in summary.items():
+        if writer is None:
+            writer = csv.DictWriter(file, fieldnames=['series', 'round', *columns])
+            writer.writeheader()
+        for round in range(ensemble.rounds):
+            writer.writerow({'series': name, 'round': round + 1,
+                             **{column: values[round] for column, values in columns.items()}})
+
+if __name__ == "__main__":
+    job = partial(hawk_dove_improved_job, num_hawks=1, num_doves=1000)
+    ensemble = run_ensemble(job, rounds=30, replicates=2000, max_workers=4, ci_width=10)
+    print(f"{ensemble.replicates} replicates, widest 95% interval {ensemble.ci_width():.2f}", file=sys.stderr)
+    write_csv(ensemble, sys.stdout)
@@ -0,0 +1,227 @@
+import numpy as np
+
+# Grids with at most this many cells always get a dense FoodGrid (8 bytes a
+# cell); bigger ones only while the food expected on them covers at least one
+# cell in DENSE_CELLS_PER_PIECE, since a SparseFood costs 32-64 bytes a piece
+DENSE_MAX_CELLS = 2**22
+DENSE_CELLS_PER_PIECE = 16
+
+EMPTY = -1
+HASH_MULTIPLIER = 0x9E3779B97F4A7C15  # 2**64 / golden ratio, for Fibonacci hashing
+
+def food_store(width, height, expected_food=0):
+    # The food store that suits a width x height grid holding about
+    # expected_food pieces at a time
+    cells = width * height
+    if cells <= DENSE_MAX_CELLS or cells <= DENSE_CELLS_PER_PIECE * expected_food:
+        return FoodGrid(width, height)
+    return SparseFood(width, height, capacity=expected_food)
+
+class FoodGrid:
+    # Food kept as a per-cell count grid, flattened so cell (x, y) is x * height + y.
+    # Several pieces of food can sit on the same cell. eaten and discarded count
+    # every piece taken by an agent or thrown away by clear().
+    def __init__(self, width, height):
+        self.width = width
+        self.height = height
+        self.counts = np.zeros(width * height, dtype=np.int64)
+        self.total = 0
+        self.eaten = 0
+        self.discarded = 0
+
+    def __len__(self):
+        return self.total
+
+    def add(self, x, y):
+        self.counts[x * self.height + y] += 1
+        self.total += 1
+
+    def add_many(self, x, y):
+        # One piece at every (x[i], y[i])
+        self.add_cells(np.asarray(x, dtype=np.int64) * self.height + np.asarray(y, dtype=np.int64))
+
+    def add_cells(self, cells):
+        np.add.at(self.counts, cells, 1)
+        self.total += len(cells)
+
+    def take(self, x, y):
+        cell = x * self.height + y
+        if self.counts[cell] == 0:
+            return False
+        self.counts[cell] -= 1
+        self.total -= 1
+        self.eaten += 1
+        return True
+
+    def take_cells(self, cells, amounts):
+        # Agents eat amounts[i] pieces off each of the distinct, stocked cells
+        self.counts[cells] -= amounts
+        eaten = int(np.sum(amounts))
+        self.total -= eaten
+        self.eaten += eaten
+
+    def counts_at(self, cells):
+        return self.counts[cells]
+
+    def stocked(self):
+        # (cells, counts) of every cell with food on it, in cell order
+        cells = np.flatnonzero(self.counts)
+        return cells, self.counts[cells]
+
+    def set_cells(self, cells, counts):
+        # Replaces the food with counts[i] pieces on each cells[i]
+        self.counts[:] = 0
+        self.counts[cells] = counts
+        self.total = int(np.sum(counts))
+
+    def clear(self):
+        self.discarded += self.total
+        self.counts[:] = 0
+        self.total = 0
+
+    def positions(self):
+        cells, counts = self.stocked()
+        cells = np.repeat(cells, counts)
+        return [(int(x), int(y)) for x, y in zip(*np.divmod(cells, self.height))]
+
+    def eat_all(self, x, y, rng=None):
+        # Every agent at (x[i], y[i]) tries to eat once; returns the indices of
+        # the agents that got food. When a cell has fewer pieces than agents on
+        # it, agents earlier in the arrays win (same as eating one by one), or,
+        # if rng is given, a random but seed-reproducible subset wins.
+        cells = x * self.height + y
+        available = self.counts_at(cells)
+        hungry = np.flatnonzero(available > 0)
+        if len(hungry) == 0:
+            return hungry
+
+        if rng is not None:
+            hungry = rng.permutation(hungry)
+        order = hungry[np.argsort(cells[hungry], kind='stable')]
+        sorted_cells = cells[order]
+        starts = np.flatnonzero(np.r_[True, sorted_cells[1:] != sorted_cells[:-1]])
+        group_sizes = np.diff(np.r_[starts, len(order)])
+        rank = np.arange(len(order)) - np.repeat(starts, group_sizes)
+
+        eaters = np.sort(order[rank < available[order]])
+        self.take_cells(sorted_cells[starts], np.minimum(group_sizes, available[order[starts]]))
+        return eaters
+
+class SparseFood(FoodGrid):
+    # Food for grids too big for a count per cell: only stocked cells are kept,
+    # in an open-addressing hash table (linear probing) of cell -> count held
+    # in numpy arrays, so bulk lookups stay vectorized at O(1) per agent.
+    # Cells eaten bare keep their slot until clear() or the next resize.
+    def __init__(self, width, height, capacity=1024):
+        self.width = width
+        self.height = height
+        self.total = 0
+        self.eaten = 0
+        self.discarded = 0
+        self.allocate(capacity)
+
+    def allocate(self, capacity):
+        # A table of at least twice capacity slots, so it stays at most half full
+        bits = max(int(2 * capacity - 1).bit_length(), 10)
+        self.keys = np.full(1 << bits, EMPTY, dtype=np.int64)
+        self.values = np.zeros(1 << bits, dtype=np.int64)
+        self.mask = (1 << bits) - 1
+        self.shift = 64 - bits
+        self.used = 0
+
+    def home_slots(self, cells):
+        return ((cells.astype(np.uint64) * np.uint64(HASH_MULTIPLIER)) >> np.uint64(self.shift)).astype(np.int64)
+
+    def find(self, cells):
+        # Slot of every cell, or -1 for cells not in the table
+        slots = self.home_slots(cells)
+        found = np.full(len(cells), -1, dtype=np.int64)
+        pending = np.arange(len(cells))
+        while len(pending):
+            keys = self.keys[slots[pending]]
+            hit = keys == cells[pending]
+            found[pending[hit]] = slots[pending[hit]]
+            pending = pending[~hit & (keys != EMPTY)]
+            slots[pending] = (slots[pending] + 1) & self.mask
+        return found
+
+    def find_one(self, cell):
+        # find for a single cell, without the array overhead
+        cell = int(cell)
+        slot = ((cell * HASH_MULTIPLIER) & 0xFFFFFFFFFFFFFFFF) >> self.shift
+        while True:
+            key = self.keys[slot]
+            if key == cell:
+                return slot
+            if key == EMPTY:
+                return -1
+            slot = (slot + 1) & self.mask
+
+    def insert(self, cells, counts):
+        # Adds counts[i] pieces on each of the distinct cells
+        if 2 * (self.used + len(cells)) > len(self.keys):
+            live_cells, live_counts = self.stocked()
+            self.allocate(2 * (len(live_cells) + len(cells)))
+            self.insert(live_cells, live_counts)
+        slots = self.home_slots(cells)
+        pending = np.arange(len(cells))
+        while len(pending):
+            keys = self.keys[slots[pending]]
+            hit = keys == cells[pending]
+            self.values[slots[pending[hit]]] += counts[pending[hit]]
+            # Several cells can claim the same free slot; the one written last
+            # keeps it and the others probe on
+            free = keys == EMPTY
+            claims = pending[free]
+            self.keys[slots[claims]] = cells[claims]
+            won = self.keys[slots[claims]] == cells[claims]
+            self.values[slots[claims[won]]] = counts[claims[won]]
+            self.used += int(np.count_nonzero(won))
+            pending = np.concatenate([pending[~hit & ~free], claims[~won]])
+            slots[pending] = (slots[pending] + 1) & self.mask
+
+    def add(self, x, y):
+        self.add_cells(np.array([x * self.height + y], dtype=np.int64))
+
+    def add_cells(self, cells):
+        unique, counts = np.unique(cells, return_counts=True)
+        self.insert(unique, counts)
+        self.total += len(cells)
+
+    def take(self, x, y):
+        slot = self.find_one(x * self.height + y)
+        if slot < 0 or self.values[slot] == 0:
+            return False
+        self.values[slot] -= 1
+        self.total -= 1
+        self.eaten += 1
+        return True
+
+    def take_cells(self, cells, amounts):
+        self.values[self.find(cells)] -= amounts
+        eaten = int(np.sum(amounts))
+        self.total -= eaten
+        self.eaten += eaten
+
+    def counts_at(self, cells):
+        slots = self.find(np.asarray(cells, dtype=np.int64))
+        return np.where(slots >= 0, self.values[slots], 0)
+
+    def stocked(self):
+        live = self.values > 0
+        cells = self.keys[live]
+        order = np.argsort(cells)
+        return cells[order], self.values[live][order]
+
+    def set_cells(self, cells, counts):
+        cells = np.asarray(cells, dtype=np.int64)
+        self.allocate(max(len(cells), len(self.keys) // 2))
+        self.insert(cells, np.asarray(counts, dtype=np.int64))
+        self.total = int(np.sum(counts))
+
+    def clear(self):
+        self.discarded += self.total
+        self.keys.fill(EMPTY)
+        self.values.fill(0)
+        self.used = 0
+        self.total = 0
@@ -1,6 +1,14 @@
 import random
 import time
-from matplotlib import pyplot as plt
+
+import numpy as np
+
+from food import food_store
+from instrumentation import RunStats
+from kernels import random_steps, resolve_backend, run_day
+from roundlog import PrintSink, RoundHistory, write_rounds
+from seeding import numpy_rng
+from spatial import SpatialIndex
 
 # Constants
 ENV_WIDTH = 100
@@ -22,111 +30,232 @@ STATUS_ACTIVE = "active"
 STATUS_RESTING = "resting"
 TYPE_HAWK = "hawk"
 TYPE_DOVE = "dove"
+# Share of a piece of food each side of a contest gets, as in Hawk&Dove.py: a
+# hawk takes everything from a dove, two doves split it, two hawks waste it
+CONTEST_SHARES = {
+    (TYPE_HAWK, TYPE_HAWK): (0, 0),
+    (TYPE_HAWK, TYPE_DOVE): (1, 0),
+    (TYPE_DOVE, TYPE_HAWK): (0, 1),
+    (TYPE_DOVE, TYPE_DOVE): (0.5, 0.5),
+}
+ROUND_TEMPLATE = """ROUND {round}
+Hawks: {hawks}, Doves: {doves}
+Dead hawks: {dead_hawks}, Dead doves: {dead_doves}
+Hawk babies: {hawk_babies}, Dove babies: {dove_babies}
+----"""
+
+# Per-simulation copy of the tunable constants above, so several simulations
+# (e.g. sweep workers) can run with different values without touching globals.
+# With encounter_radius set, an agent that finds food contests it with a random
+# agent at most that many cells away (0 = same cell), splitting it by
+# contest_shares; None keeps agents from interacting at all.
+class Config:
+    def __init__(self, food_spawn_rate=FOOD_SPAWN_RATE, day_length=DAY_LENGTH, night_length=NIGHT_LENGTH,
+                 starting_energy=STARTING_ENERGY, energy_required_for_reproduction=ENERGY_REQUIRED_FOR_REPRODUCTION,
+                 energy_loss_per_day=ENERGY_LOSS_PER_DAY, energy_loss_per_night=ENERGY_LOSS_PER_NIGHT,
+                 energy_gain_from_food=ENERGY_GAIN_FROM_FOOD, energy_required_for_living=ENERGY_REQUIRED_FOR_LIVING,
+                 encounter_radius=None, contest_shares=CONTEST_SHARES):
+        self.food_spawn_rate = food_spawn_rate
+        self.day_length = day_length
+        self.night_length = night_length
+        self.starting_energy = starting_energy
+        self.energy_required_for_reproduction = energy_required_for_reproduction
+        self.energy_loss_per_day = energy_loss_per_day
+        self.energy_loss_per_night = energy_loss_per_night
+        self.energy_gain_from_food = energy_gain_from_food
+        self.energy_required_for_living = energy_required_for_living
+        self.encounter_radius = encounter_radius
+        self.contest_shares = contest_shares
 
 class Agent:
-    def __init__(self, agent_type, x, y):
+    def __init__(self, agent_type, x, y, energy=STARTING_ENERGY):
         self.type = agent_type
-        self.energy = STARTING_ENERGY
+        self.energy = energy
         self.x = x
         self.y = y
         self.status = STATUS_ACTIVE
 
-    def move(self, env_width, env_height):
-        self.x = (self.x + random.choice([-1, 0, 1])) % env_width
-        self.y = (self.y + random.choice([-1, 0, 1])) % env_height
+    def move(self, env_width, env_height, rng=random):
+        self.x = (self.x + rng.choice([-1, 0, 1])) % env_width
+        self.y = (self.y + rng.choice([-1, 0, 1])) % env_height
 
-    def eat(self, food_positions):
+    def eat(self, food, energy_gain=ENERGY_GAIN_FROM_FOOD):
         
-        if (self.x, self.y) in food_positions:
-            print("yes")
+        if food.take(self.x, self.y):
+            # print("yes")
             
-            self.energy += ENERGY_GAIN_FROM_FOOD
-            food_positions.remove((self.x, self.y))
+            self.energy += energy_gain
 
 class Environment:
-    def __init__(self, width, height):
+    def __init__(self, width, height, food_spawn_rate=FOOD_SPAWN_RATE, rng=None):
         self.width = width
         self.height = height
-        self.food_positions = []
+        self.food_spawn_rate = food_spawn_rate
+        self.rng = rng if rng is not None else np.random.default_rng()
+        self.food = food_store(width, height, food_spawn_rate)
+
+    @property
+    def food_positions(self):
+        return self.food.positions()
 
     def spawn_food(self):
-        for _ in range(FOOD_SPAWN_RATE):
-            self.food_positions.append((random.randint(0, self.width - 1), random.randint(0, self.height - 1)))
+        self.food.add_many(self.rng.integers(0, self.width, self.food_spawn_rate),
+                           self.rng.integers(0, self.height, self.food_spawn_rate))
 
 class Simulation:
-    def __init__(self, env_width, env_height, starting_doves, starting_hawks, rounds):
-        self.env = Environment(env_width, env_height)
+    # rng is anything with the random module's interface, e.g. random.Random(seed).
+    # stats collects per-phase timings and event counters for run().
+    # backend picks how day_phase runs (see kernels); anything but 'python'
+    # draws its moves from a numpy Generator seeded from rng.
+    def __init__(self, env_width, env_height, starting_doves, starting_hawks, rounds, config=None, rng=random, stats=None,
+                 backend='python'):
+        self.config = config if config is not None else Config()
+        self.rng = rng
+        self.backend = resolve_backend(backend)
+        if self.config.encounter_radius is not None and self.backend != 'python':
+            raise ValueError("encounters are only simulated by the 'python' backend")
+        self.kernel_rng = numpy_rng(rng) if self.backend != 'python' else None
+        self.stats = stats if stats is not None else RunStats()
+        self.env = Environment(env_width, env_height, self.config.food_spawn_rate, numpy_rng(rng))
         self.agents = self.init_agents(starting_doves, starting_hawks)
         self.rounds = rounds
-        self.graph_hawk_points = []
-        self.graph_dove_points = []
+        self.current_round = 1
+        self.death_count = 0
+        self.breed_count = 0
+        self.encounter_count = 0
 
     def init_agents(self, doves, hawks):
         agents = []
         for _ in range(doves):
-            agents.append(Agent(TYPE_DOVE, random.randint(0, ENV_WIDTH - 1), random.randint(0, ENV_HEIGHT - 1)))
+            agents.append(self.new_agent(TYPE_DOVE))
         for _ in range(hawks):
-            agents.append(Agent(TYPE_HAWK, random.randint(0, ENV_WIDTH - 1), random.randint(0, ENV_HEIGHT - 1)))
+            agents.append(self.new_agent(TYPE_HAWK))
         return agents
 
-    def run(self):
-        current_round = 1
-        death_count = 0
-        breed_count = 0
-
-        while current_round <= self.rounds and len(self.agents) > 2:
-            print(f"ROUND {current_round}")
-
-            self.env.spawn_food()
-            self.day_phase()
-            self.night_phase()
-            round_dead_hawks, round_dead_doves = self.cull()
-            round_hawk_babies, round_dove_babies = self.breed()
-            death_count += (round_dead_hawks + round_dead_doves)
-            breed_count += (round_hawk_babies + round_dove_babies)
-
-            hawk_count = self.get_agent_count_by_type(TYPE_HAWK)
-            dove_count = self.get_agent_count_by_type(TYPE_DOVE)
-            print(f"Hawks: {hawk_count}, Doves: {dove_count}")
-            print(f"Dead hawks: {round_dead_hawks}, Dead doves: {round_dead_doves}")
-            print(f"Hawk babies: {round_hawk_babies}, Dove babies: {round_dove_babies}")
-            print("----")
-
-            self.graph_hawk_points.append(hawk_count)
-            self.graph_dove_points.append(dove_count)
-            current_round += 1
-
-        print("=============================================================")
-        print(f"Total dead agents: {death_count}")
-        print(f"Total breeding agents: {breed_count}")
-        print(f"Total rounds completed: {current_round - 1}")
-        print(f"Total population size: {len(self.agents)}")
-        print(f"Hawks: {self.get_percentage_by_type(TYPE_HAWK)}")
-        print(f"Doves: {self.get_percentage_by_type(TYPE_DOVE)}")
-        print("=============================================================")
-
-        self.plot_results()
+    def new_agent(self, agent_type):
+        return Agent(agent_type, self.rng.randint(0, self.env.width - 1), self.rng.randint(0, self.env.height - 1),
+                     self.config.starting_energy)
+
+    def iter_rounds(self):
+        # Runs the simulation lazily, yielding one record per round (see roundlog)
+        while self.current_round <= self.rounds and len(self.agents) > 2:
+            food_eaten = self.env.food.eaten
+            encounters = self.encounter_count
+            with self.stats.phase('spawn_food'):
+                self.env.spawn_food()
+            self.stats.count('moves', self.config.day_length * len(self.agents))
+            with self.stats.phase('day_phase'):
+                self.day_phase()
+            self.stats.count('food_eaten', self.env.food.eaten - food_eaten)
+            self.stats.count('encounters', self.encounter_count - encounters)
+            with self.stats.phase('night_phase'):
+                self.night_phase()
+            with self.stats.phase('cull'):
+                round_dead_hawks, round_dead_doves = self.cull()
+            with self.stats.phase('breed'):
+                round_hawk_babies, round_dove_babies = self.breed()
+            self.stats.count('deaths', round_dead_hawks + round_dead_doves)
+            self.stats.count('births', round_hawk_babies + round_dove_babies)
+            self.death_count += (round_dead_hawks + round_dead_doves)
+            self.breed_count += (round_hawk_babies + round_dove_babies)
+
+            record = {
+                'round': self.current_round,
+                'hawks': self.get_agent_count_by_type(TYPE_HAWK),
+                'doves': self.get_agent_count_by_type(TYPE_DOVE),
+                'dead_hawks': round_dead_hawks,
+                'dead_doves': round_dead_doves,
+                'hawk_babies': round_hawk_babies,
+                'dove_babies': round_dove_babies,
+            }
+            self.stats.end_round(self.current_round)
+            self.current_round += 1
+            yield record
+
+    def run(self, verbose=False, plot=False, sinks=()):
+        # Every round record goes to each of sinks; nothing is kept in memory
+        # unless plot is set
+        sinks = list(sinks)
+        if verbose:
+            sinks.append(PrintSink(ROUND_TEMPLATE))
+        if plot:
+            history = RoundHistory()
+            sinks.append(history)
+        write_rounds(self.iter_rounds(), sinks)
+
+        if verbose:
+            print("=============================================================")
+            print(f"Total dead agents: {self.death_count}")
+            print(f"Total breeding agents: {self.breed_count}")
+            print(f"Total rounds completed: {self.current_round - 1}")
+            print(f"Total population size: {len(self.agents)}")
+            print(f"Hawks: {self.get_percentage_by_type(TYPE_HAWK)}")
+            print(f"Doves: {self.get_percentage_by_type(TYPE_DOVE)}")
+            print("=============================================================")
+
+        if plot:
+            self.plot_results(history)
 
     def day_phase(self):
-        for day in range(DAY_LENGTH):
+        if self.backend != 'python':
+            return self.kernel_day_phase()
+        if self.config.encounter_radius is not None:
+            return self.encounter_day_phase()
+        for day in range(self.config.day_length):
             for agent in self.agents:
-                agent.move(self.env.width, self.env.height)
-                agent.eat(self.env.food_positions)
+                agent.move(self.env.width, self.env.height, self.rng)
+                agent.eat(self.env.food, self.config.energy_gain_from_food)
                 # print(agent.energy,"day",day)
-                agent.energy -= ENERGY_LOSS_PER_DAY
+                agent.energy -= self.config.energy_loss_per_day
+
+    def encounter_day_phase(self):
+        # Same moves as day_phase, but food is contested with a nearby agent.
+        # The index is rebuilt once a day and kept up to date on every move.
+        index = SpatialIndex.build(self.env.width, self.env.height, self.agents)
+        for day in range(self.config.day_length):
+            for agent in self.agents:
+                x, y = agent.x, agent.y
+                agent.move(self.env.width, self.env.height, self.rng)
+                index.move(agent, x, y, agent.x, agent.y)
+                if self.env.food.take(agent.x, agent.y):
+                    self.contest(agent, index)
+                agent.energy -= self.config.energy_loss_per_day
+
+    def contest(self, agent, index):
+        rivals = [other for other in index.neighbors(agent.x, agent.y, self.config.encounter_radius) if other is not agent]
+        if not rivals:
+            agent.energy += self.config.energy_gain_from_food
+            return
+        rival = self.rng.choice(rivals)
+        share, rival_share = self.config.contest_shares[(agent.type, rival.type)]
+        agent.energy += share * self.config.energy_gain_from_food
+        rival.energy += rival_share * self.config.energy_gain_from_food
+        self.encounter_count += 1
+
+    def kernel_day_phase(self):
+        x = np.array([agent.x for agent in self.agents], dtype=np.int64)
+        y = np.array([agent.y for agent in self.agents], dtype=np.int64)
+        energy = np.array([agent.energy for agent in self.agents], dtype=np.float64)
+        steps = random_steps(self.kernel_rng, self.config.day_length, len(self.agents))
+        run_day(self.backend, x, y, energy, self.env.food, steps,
+                self.config.energy_gain_from_food, self.config.energy_loss_per_day)
+        for agent, agent_x, agent_y, agent_energy in zip(self.agents, x.tolist(), y.tolist(), energy.tolist()):
+            agent.x = agent_x
+            agent.y = agent_y
+            agent.energy = agent_energy
 
     def night_phase(self):
-        for night in range(NIGHT_LENGTH):
+        for night in range(self.config.night_length):
             for agent in self.agents:
                 # print(agent.energy,"night",night)
-                agent.energy -= ENERGY_LOSS_PER_NIGHT
+                agent.energy -= self.config.energy_loss_per_night
 
     def cull(self):
         dead_hawks = 0
         dead_doves = 0
         new_agents = []
         for agent in self.agents:
-            if agent.energy < ENERGY_REQUIRED_FOR_LIVING:
+            if agent.energy < self.config.energy_required_for_living:
                 if agent.type == TYPE_HAWK:
                     dead_hawks += 1
                 else:
@@ -142,10 +271,10 @@ class Simulation:
         dove_babies = 0
         new_agents = []
         for agent in self.agents:
-            if agent.energy >= ENERGY_REQUIRED_FOR_REPRODUCTION:
+            if agent.energy >= self.config.energy_required_for_reproduction:
                 # baby_energy = agent.energy // 2
                 agent.energy //= 2
-                new_agents.append(Agent(agent.type, random.randint(0, ENV_WIDTH - 1), random.randint(0, ENV_HEIGHT - 1)))
+                new_agents.append(self.new_agent(agent.type))
                 # new_agents.append(Agent(agent.type, random.randint(0, ENV_WIDTH - 1), random.randint(0, ENV_HEIGHT - 1)))
                 if agent.type == TYPE_HAWK:
                     hawk_babies += 1
@@ -164,9 +293,10 @@ class Simulation:
         count = self.get_agent_count_by_type(agent_type)
         return f"{(count / total_agents) * 100:.2f}%"
 
-    def plot_results(self):
-        plt.plot(self.graph_dove_points, label="Doves")
-        plt.plot(self.graph_hawk_points, label="Hawks")
+    def plot_results(self, history):
+        from matplotlib import pyplot as plt
+        plt.plot(history['doves'], label="Doves")
+        plt.plot(history['hawks'], label="Hawks")
         plt.xlabel("Rounds")
         plt.ylabel("Population")
         plt.legend()
@@ -174,4 +304,4 @@ class Simulation:
 
 if __name__ == "__main__":
     simulation = Simulation(ENV_WIDTH, ENV_HEIGHT, STARTING_DOVES, STARTING_HAWKS, ROUNDS)
-    simulation.run()
+    simulation.run(verbose=True, plot=True)
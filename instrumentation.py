@@ -0,0 +1,47 @@
+import json
+import time
+from contextlib import contextmanager
+
+class RunStats:
+    # Phase timers and event counters for a Simulation.run. Totals cover the
+    # whole run; the round_* dicts cover the current round and are handed to
+    # every exporter (a callable taking round, phase seconds and counters)
+    # when the round ends.
+    def __init__(self, exporters=()):
+        self.exporters = list(exporters)
+        self.phase_seconds = {}
+        self.counters = {}
+        self.round_phase_seconds = {}
+        self.round_counters = {}
+
+    @contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            self.round_phase_seconds[name] = self.round_phase_seconds.get(name, 0.0) + elapsed
+            self.phase_seconds[name] = self.phase_seconds.get(name, 0.0) + elapsed
+
+    def count(self, name, amount=1):
+        self.round_counters[name] = self.round_counters.get(name, 0) + amount
+        self.counters[name] = self.counters.get(name, 0) + amount
+
+    def end_round(self, round):
+        for exporter in self.exporters:
+            exporter(round, self.round_phase_seconds, self.round_counters)
+        self.round_phase_seconds = {}
+        self.round_counters = {}
+
+    def summary(self):
+        return {'phase_seconds': dict(self.phase_seconds), 'counters': dict(self.counters)}
+
+class JsonLinesExporter:
+    # Writes one JSON object per round to an open text file
+    def __init__(self, file):
+        self.file = file
+
+    def __call__(self, round, phase_seconds, counters):
+        self.file.write(json.dumps({'round': round, 'phase_seconds': phase_seconds, 'counters': counters}) + '\n')
+        self.file.flush()
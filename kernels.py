@@ -0,0 +1,231 @@
+import numpy as np
+
+from food import FoodGrid, SparseFood
+
+try:
+    import numba
+except ImportError:
+    numba = None
+
+# Array kernel for the day phase of the spatial simulations: every tick each
+# agent takes a random step, eats a piece of food on its cell if there is one
+# (agents earlier in the arrays first) and loses energy. Simulations pick a
+# backend: 'python' keeps their own per-Agent loop, 'numpy' runs the kernel
+# one vectorized tick at a time, 'numba' runs it compiled, 'events' fast-forwards
+# the whole stretch at once (see fast_forward_day), and 'auto' is numba when it
+# is installed, numpy otherwise.
+BACKENDS = ('python', 'numpy', 'numba', 'events', 'auto')
+
+# Most agent-ticks the 'events' backend fast-forwards in one go; longer days
+# run as several blocks of ticks so the walk arrays stay a bounded size
+EVENT_BLOCK = 2**20
+
+# Largest |z| compare_backends accepts between a backend and the python path
+Z_BOUND = 4
+
+def resolve_backend(backend):
+    if backend not in BACKENDS:
+        raise ValueError(f'unknown backend {backend!r}, expected one of {BACKENDS}')
+    if backend == 'auto':
+        return 'numba' if numba is not None else 'numpy'
+    if backend == 'numba' and numba is None:
+        raise ImportError("the 'numba' backend needs numba installed")
+    return backend
+
+def day_loop(x, y, energy, counts, steps, width, height, energy_gain, energy_loss):
+    # steps is (ticks, 2, agents) of -1/0/1; updates everything in place and
+    # returns the number of pieces eaten
+    eaten = 0
+    for tick in range(steps.shape[0]):
+        for i in range(x.shape[0]):
+            x[i] = (x[i] + steps[tick, 0, i]) % width
+            y[i] = (y[i] + steps[tick, 1, i]) % height
+            cell = x[i] * height + y[i]
+            if counts[cell] > 0:
+                counts[cell] -= 1
+                energy[i] += energy_gain
+                eaten += 1
+            energy[i] -= energy_loss
+    return eaten
+
+compiled_day_loop = numba.njit(cache=True)(day_loop) if numba is not None else None
+
+def fast_forward_day(x, y, energy, food, steps, energy_gain, energy_loss):
+    # Same result as day_loop without eating tick by tick: each agent's walk is
+    # a cumulative sum of its steps, and since food only runs out during
+    # the day, the only visits that can eat are visits to cells stocked at the
+    # start. Taken in (tick, agent) order, as day_loop makes them, the first
+    # counts[cell] visits to a cell each eat one piece and the rest find it bare.
+    ticks, agents = len(steps), len(x)
+    if ticks == 0:
+        return
+    # Running sum of the steps a tick row at a time (np.cumsum along the tick
+    # axis is several times slower), wrapped onto the grid at the end
+    walk = np.empty(steps.shape, dtype=np.int32)
+    np.add(np.stack([x, y]), steps[0], out=walk[0], casting='unsafe')
+    for tick in range(1, ticks):
+        np.add(walk[tick - 1], steps[tick], out=walk[tick])
+    walk[:, 0] %= food.width
+    walk[:, 1] %= food.height
+    cells = (walk[:, 0].astype(np.int64) * food.height + walk[:, 1]).ravel()
+    visits = np.flatnonzero(food.counts_at(cells) > 0)
+
+    # Group the visits by cell, keeping them in time order within a cell
+    order = np.argsort(cells[visits], kind='stable')
+    visits = visits[order]
+    sorted_cells = cells[visits]
+    starts = np.flatnonzero(np.diff(sorted_cells, prepend=-1))
+    group_sizes = np.diff(np.r_[starts, len(visits)])
+    rank = np.arange(len(visits)) - np.repeat(starts, group_sizes)
+    available = food.counts_at(sorted_cells[starts])
+    eaters = visits[rank < np.repeat(available, group_sizes)] % agents
+
+    energy += energy_gain * np.bincount(eaters, minlength=agents) - energy_loss * ticks
+    food.take_cells(sorted_cells[starts], np.minimum(group_sizes, available))
+    x[:] = walk[-1, 0]
+    y[:] = walk[-1, 1]
+
+def run_day(backend, x, y, energy, food, steps, energy_gain, energy_loss):
+    # Runs len(steps) ticks over the agent columns and a food store. The
+    # compiled loop needs a dense FoodGrid; on SparseFood 'numba' runs the
+    # events kernel instead, which eats exactly the same food.
+    if backend == 'events' or (backend == 'numba' and isinstance(food, SparseFood)):
+        block = max(EVENT_BLOCK // max(len(x), 1), 1)
+        for start in range(0, len(steps), block):
+            fast_forward_day(x, y, energy, food, steps[start:start + block], energy_gain, energy_loss)
+        return
+    if backend == 'numba':
+        eaten = int(compiled_day_loop(x, y, energy, food.counts, steps, food.width, food.height,
+                                      energy_gain, energy_loss))
+        food.total -= eaten
+        food.eaten += eaten
+        return
+    for tick in range(len(steps)):
+        x[:] = (x + steps[tick, 0]) % food.width
+        y[:] = (y + steps[tick, 1]) % food.height
+        energy[food.eat_all(x, y)] += energy_gain
+        energy -= energy_loss
+
+def random_steps(rng, ticks, agents):
+    return rng.integers(-1, 2, size=(ticks, 2, agents), dtype=np.int8)
+
+def check_exact(trials, seed=0):
+    # Differential check of the array backends against day_loop: random grids,
+    # populations, food on a FoodGrid or a SparseFood and tick counts, with
+    # the same steps split at a random tick into two run_day calls. Returns
+    # a description of every mismatch.
+    rng = np.random.default_rng(seed)
+    backends = ['numpy', 'events'] + (['numba'] if numba is not None else [])
+    failed = []
+    for trial in range(trials):
+        width, height = rng.integers(1, 40, size=2)
+        agents = int(rng.integers(0, 60))
+        ticks = int(rng.integers(0, 30))
+        x0 = rng.integers(0, width, agents)
+        y0 = rng.integers(0, height, agents)
+        energy0 = rng.uniform(0, 200, agents)
+        cells = rng.integers(0, width * height, int(rng.integers(0, 3 * width * height)))
+        steps = random_steps(rng, ticks, agents)
+        split = int(rng.integers(0, ticks + 1))
+        energy_gain, energy_loss = 35.0, rng.uniform(0, 1)
+
+        x, y, energy = x0.copy(), y0.copy(), energy0.copy()
+        counts = np.bincount(cells, minlength=width * height).astype(np.int64)
+        eaten = day_loop(x, y, energy, counts, steps, width, height, energy_gain, energy_loss)
+        for backend in backends:
+            for store in (FoodGrid, SparseFood):
+                food = store(width, height)
+                food.add_cells(cells)
+                got_x, got_y, got_energy = x0.copy(), y0.copy(), energy0.copy()
+                for part in (steps[:split], steps[split:]):
+                    run_day(backend, got_x, got_y, got_energy, food, part, energy_gain, energy_loss)
+                # The events kernel sums a day's energy changes in another order
+                if not ((got_x == x).all() and (got_y == y).all() and np.allclose(got_energy, energy)
+                        and (food.counts_at(np.arange(width * height)) == counts).all()
+                        and food.eaten == eaten and len(food) == len(cells) - eaten):
+                    failed.append(f'{backend} on {store.__name__}, trial {trial}')
+    return failed
+
+def z_score(sample, reference):
+    # z-score of the difference between two sample means
+    spread = np.hypot(sample.std(), reference.std())
+    if spread == 0:
+        return 0.0 if sample.mean() == reference.mean() else np.inf
+    return (sample.mean() - reference.mean()) / spread * len(sample) ** 0.5
+
+def compare_backends(name, make_simulation, run_day_phase, total_energy, days, backends, bound=Z_BOUND):
+    # Runs days independent days per backend and prints the mean and standard
+    # error of the food eaten and the energy left, plus the z-score of each
+    # backend's mean against the python path; returns the backends whose |z|
+    # is above bound
+    results = {}
+    for backend in backends:
+        eaten, energy = [], []
+        for day in range(days):
+            simulation = make_simulation(backend, day)
+            simulation.env.spawn_food()
+            before = simulation.env.food.eaten
+            run_day_phase(simulation)
+            eaten.append(simulation.env.food.eaten - before)
+            energy.append(total_energy(simulation))
+        results[backend] = np.array(eaten, dtype=np.float64), np.array(energy, dtype=np.float64)
+
+    print(name)
+    failed = []
+    reference_eaten, reference_energy = results['python']
+    for backend, (eaten, energy) in results.items():
+        line = f"  {backend:8} food eaten {eaten.mean():10.2f} +- {eaten.std() / days ** 0.5:6.2f}"
+        line += f"   energy {energy.mean():12.2f} +- {energy.std() / days ** 0.5:6.2f}"
+        if backend != 'python':
+            z_eaten = z_score(eaten, reference_eaten)
+            z_energy = z_score(energy, reference_energy)
+            line += f"   z = {z_eaten:+.2f} / {z_energy:+.2f}"
+            if max(abs(z_eaten), abs(z_energy)) > bound:
+                failed.append(f'{name} {backend}')
+                line += '   FAILED'
+        print(line)
+    return failed
+
+if __name__ == "__main__":
+    # Exactness check of the array backends against day_loop, then the
+    # statistical equivalence check of the simulations' backends against their
+    # per-Agent python loop; exits non-zero when either fails
+    import random
+    import sys
+
+    from script_loader import load_script
+    import naturalselection
+    import with_animation
+
+    v3 = load_script('hawk&Dove_v3.py')
+    backends = ['python', 'numpy', 'events'] + (['numba'] if numba is not None else [])
+
+    failed = check_exact(300)
+    print(f"exact against day_loop: {'FAILED ' + ', '.join(failed) if failed else 'ok'}")
+    failed += compare_backends('hawk&Dove_v3.Simulation.day_phase',
+                              lambda backend, day: v3.Simulation(30, 30, 50, 50, 1, rng=random.Random(day), backend=backend),
+                              lambda simulation: simulation.day_phase(),
+                              lambda simulation: sum(agent.energy for agent in simulation.agents),
+                              200, backends)
+    # Fractional energies, which the kernels have to keep as floats
+    fractional = v3.Config(energy_loss_per_day=2.5, energy_gain_from_food=37.5)
+    failed += compare_backends('hawk&Dove_v3.Simulation.day_phase (fractional energy)',
+                              lambda backend, day: v3.Simulation(30, 30, 50, 50, 1, config=fractional,
+                                                                 rng=random.Random(day), backend=backend),
+                              lambda simulation: simulation.day_phase(),
+                              lambda simulation: sum(agent.energy for agent in simulation.agents),
+                              200, backends)
+    failed += compare_backends('naturalselection.Simulation.day_phase',
+                              lambda backend, day: naturalselection.Simulation(naturalselection.ENV_WIDTH, naturalselection.ENV_HEIGHT,
+                                                                               50, 1, rng=random.Random(day), backend=backend),
+                              lambda simulation: simulation.day_phase(1),
+                              lambda simulation: sum(player.energy for player in simulation.players),
+                              100, backends)
+    failed += compare_backends('with_animation.Simulation.day_phase',
+                              lambda backend, day: with_animation.Simulation(with_animation.ENV_WIDTH, with_animation.ENV_HEIGHT,
+                                                                             50, 1, rng=random.Random(day), backend=backend),
+                              lambda simulation: simulation.day_phase(),
+                              lambda simulation: sum(player.energy for player in simulation.players),
+                              200, backends)
+    if failed:
+        sys.exit('backends differ: ' + ', '.join(failed))
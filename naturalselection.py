@@ -1,6 +1,16 @@
+import os
 import random
 import time
-from matplotlib import pyplot as plt
+from functools import lru_cache
+import numpy as np
+
+import checkpoint
+from agents import AgentArray, Population, decode_sequences, encode_sequences, packed_length
+from food import food_store
+from instrumentation import RunStats
+from kernels import random_steps, resolve_backend, run_day
+from seeding import child_seeds, numpy_rng, python_rng
+from sharded import ShardPool
 
 # Constants
 ENV_WIDTH = 100
@@ -19,25 +29,34 @@ BASE_ENERGY_REQUIRED_FOR_REPRODUCTION = 200
 STATUS_ACTIVE = "active"
 STATUS_RESTING = "resting"
 MUTATION_PROBABILITY=0.1
+GENOME_LENGTH = 4
+# Longest stretch of the day the kernel backends draw moves for at once
+KERNEL_TICKS = 50
 # increase no. of ilteration in a day so that population get chance to eat food.
-def mutate_genome_sequence(sequence):
+def mutate_genome_sequence(sequence, rng=random):
     sequence_list = list(sequence)
     for i in range(len(sequence_list)):
-        if random.random() < MUTATION_PROBABILITY:
-            sequence_list[i] = random.choice('ATGC')
+        if rng.random() < MUTATION_PROBABILITY:
+            sequence_list[i] = rng.choice('ATGC')
     return ''.join(sequence_list)
+# Most newborns share a genome with someone already alive, so fitness is
+# computed once per distinct sequence
+@lru_cache(maxsize=2**16)
+def sequence_fitness(sequence):
+    count_A = sequence.count('A')
+    count_C = sequence.count('C')
+    count_G = sequence.count('G')
+    count_T = sequence.count('T')
+    fitness = count_A * 4 + count_C * 3 + count_G * 2 + count_T * 1
+    return fitness
+
 class Genome:
     def __init__(self, sequence):
         self.sequence = sequence
         self.fitness = self.calculate_fitness()
 
     def calculate_fitness(self):
-        count_A = self.sequence.count('A')
-        count_C = self.sequence.count('C')
-        count_G = self.sequence.count('G')
-        count_T = self.sequence.count('T')
-        fitness = count_A * 4 + count_C * 3 + count_G * 2 + count_T * 1
-        return fitness
+        return sequence_fitness(self.sequence)
 
 class Agent:
     def __init__(self, x, y, genome):
@@ -53,102 +72,171 @@ class Agent:
         # print(self.energy_required_for_living,self.energy_required_for_reproduction)
         self.status = STATUS_ACTIVE
 
-    def move(self, env_width, env_height):
-        self.x = (self.x + random.choice([-1, 0, 1])) % env_width
-        self.y = (self.y + random.choice([-1, 0, 1])) % env_height
+    def move(self, env_width, env_height, rng=random):
+        self.x = (self.x + rng.choice([-1, 0, 1])) % env_width
+        self.y = (self.y + rng.choice([-1, 0, 1])) % env_height
         # print(self.x,self.y)
 
-    def eat(self, food_positions):
-        if (self.x, self.y) in food_positions:
+    def eat(self, food):
+        if food.take(self.x, self.y):
             # print("yes")
             self.energy += ENERGY_GAIN_FROM_FOOD
             # print(self.energy)
-            food_positions.remove((self.x, self.y))
 
 class Environment:
-    def __init__(self, width, height):
+    def __init__(self, width, height, rng=None):
         self.width = width
         self.height = height
-        self.food_positions = []
+        self.rng = rng if rng is not None else np.random.default_rng()
+        self.food = food_store(width, height, FOOD_SPAWN_RATE)
+
+    @property
+    def food_positions(self):
+        return self.food.positions()
 
     def spawn_food(self):
-        for _ in range(FOOD_SPAWN_RATE):
-            self.food_positions.append((random.randint(0, self.width - 1), random.randint(0, self.height - 1)))
+        self.food.add_many(self.rng.integers(0, self.width, FOOD_SPAWN_RATE),
+                           self.rng.integers(0, self.height, FOOD_SPAWN_RATE))
 
 class Simulation:
-    def __init__(self, env_width, env_height, starting_players, rounds):
-        self.env = Environment(env_width, env_height)
+    # observers get on_tick every observe_every ticks of the day (or only on the
+    # last tick of each day when observe_every is None), plus on_start (also
+    # when a resumed simulation runs on), on_round and on_finish.
+    # With no observers the simulation never touches matplotlib.
+    # stats collects per-phase timings and event counters for run(), which
+    # prints each round's summary when verbose is set.
+    # backend picks how day_phase runs (see kernels); anything but 'python'
+    # draws its moves from a numpy Generator seeded from rng.
+    def __init__(self, env_width, env_height, starting_players, rounds, observers=(), observe_every=1, rng=random, stats=None,
+                 backend='python'):
+        self.rng = rng
+        self.backend = resolve_backend(backend)
+        self.kernel_rng = self.new_kernel_rng() if self.backend != 'python' else None
+        self.stats = stats if stats is not None else RunStats()
+        self.env = Environment(env_width, env_height, numpy_rng(rng))
         self.players = self.init_players(starting_players)
         self.rounds = rounds
         self.graph_player_points = []
-                # Initialize plot
-        plt.ion()  
-        self.fig, self.ax = plt.subplots(figsize=(8, 8))
-        self.ax.set_xlim(0, ENV_WIDTH)
-        self.ax.set_ylim(0, ENV_HEIGHT)
-        self.food_scatter = self.ax.scatter([], [], c='green', label='Food', marker='*')
-        self.player_scatter = self.ax.scatter([], [], c='blue', label='Players', marker='x')
-        self.ax.legend()
-        self.ax.grid()
+        self.observers = list(observers)
+        self.observe_every = observe_every
+        self.current_round = 1
+        self.death_count = 0
+        self.breed_count = 0
 
     def init_players(self, players):
         players_list = []
         for _ in range(players):
-            genome_sequence = ''.join(random.choices('ATGC', k=4))  # Example genome sequence
+            genome_sequence = ''.join(self.rng.choices('ATGC', k=GENOME_LENGTH))  # Example genome sequence
             # print(genome_sequence)
             genome = Genome(genome_sequence)
-            players_list.append(Agent(random.randint(0, ENV_WIDTH - 1), random.randint(0, ENV_HEIGHT - 1), genome))
-        return players_list
-
-    def run(self):
-        current_round = 1
-        death_count = 0
-        breed_count = 0
-
-        while current_round <= self.rounds and len(self.players) > 2:
-            print(f"ROUND {current_round}")
-
-            self.env.spawn_food()
-            print("fooooooodd",len(self.env.food_positions))
-            self.day_phase(current_round)
-            self.night_phase()
-            round_dead_players = self.cull()
-            round_player_babies = self.breed()
-            death_count += round_dead_players
-            breed_count += round_player_babies
+            players_list.append(Agent(self.rng.randint(0, self.env.width - 1), self.rng.randint(0, self.env.height - 1), genome))
+        return Population(players_list)
+
+    def run(self, verbose=False):
+        for observer in self.observers:
+            observer.on_start(self)
+        while self.current_round <= self.rounds and len(self.players) > 2:
+            if verbose:
+                print(f"ROUND {self.current_round}")
+
+            food_eaten = self.env.food.eaten
+            food_discarded = self.env.food.discarded
+            with self.stats.phase('spawn_food'):
+                self.env.spawn_food()
+            if verbose:
+                print("fooooooodd",len(self.env.food))
+            self.stats.count('moves', (ROUND_DURATION - 1) * len(self.players))
+            with self.stats.phase('day_phase'):
+                self.day_phase(self.current_round)
+            self.stats.count('food_eaten', self.env.food.eaten - food_eaten)
+            self.stats.count('food_wasted', self.env.food.discarded - food_discarded)
+            with self.stats.phase('night_phase'):
+                self.night_phase()
+            with self.stats.phase('cull'):
+                round_dead_players = self.cull()
+            with self.stats.phase('breed'):
+                round_player_babies = self.breed()
+            self.stats.count('deaths', round_dead_players)
+            self.stats.count('births', round_player_babies)
+            self.death_count += round_dead_players
+            self.breed_count += round_player_babies
             
             player_count = self.get_count()
-            print(f"players: {player_count}")
-            print(f"Dead agents: {round_dead_players}")
-            print(f"player babies: {round_player_babies}")
-            print("----")
+            if verbose:
+                print(f"players: {player_count}")
+                print(f"Dead agents: {round_dead_players}")
+                print(f"player babies: {round_player_babies}")
+                print("----")
 
             self.graph_player_points.append(player_count)
-            current_round += 1
+            self.stats.end_round(self.current_round)
+            self.current_round += 1
+            for observer in self.observers:
+                observer.on_round(self, self.current_round - 1)
 
-        print("=============================================================")
-        print(f"Total dead agents: {death_count}")
-        print(f"Total breeding agents: {breed_count}")
-        print(f"Total rounds completed: {current_round - 1}")
-        print(f"Total population size: {len(self.players)}")
-        print("=============================================================")
+        if verbose:
+            print("=============================================================")
+            print(f"Total dead agents: {self.death_count}")
+            print(f"Total breeding agents: {self.breed_count}")
+            print(f"Total rounds completed: {self.current_round - 1}")
+            print(f"Total population size: {len(self.players)}")
+            print("=============================================================")
 
-        self.plot_results()
+        for observer in self.observers:
+            observer.on_finish(self)
 
     def day_phase(self,round):
+        if self.backend != 'python':
+            return self.kernel_day_phase(round)
         start_time=1
         while True:
             for player in self.players:
-                player.move(self.env.width, self.env.height)
-                player.eat(self.env.food_positions)
+                player.move(self.env.width, self.env.height, self.rng)
+                player.eat(self.env.food)
                 # print(player.genome.sequence)
                 player.energy -= ENERGY_LOSS_PER_DAY/ROUND_DURATION
                 # [print(player.energy)]
-            self.update_plot(round,start_time)
+            self.notify_tick(round,start_time)
             start_time+=1
             if start_time >= ROUND_DURATION:
                 break
-        self.env.food_positions=[]
+        self.env.food.clear()
+
+    def kernel_day_phase(self, round):
+        # Draws the day's moves KERNEL_TICKS ticks at a time whatever the
+        # observers, so they see the same run as an unobserved simulation, and
+        # runs each stretch in pieces that stop at every tick they want to see
+        x, y, energy = self.player_state()
+        for start in range(1, ROUND_DURATION, KERNEL_TICKS):
+            end = min(start + KERNEL_TICKS, ROUND_DURATION)
+            steps = random_steps(self.kernel_rng, end - start, len(x))
+            tick = start
+            while tick < end:
+                stop = end
+                if self.observers and self.observe_every is not None:
+                    stop = min(stop, -(-tick // self.observe_every) * self.observe_every + 1)
+                run_day(self.backend, x, y, energy, self.env.food, steps[tick - start:stop - start],
+                        ENERGY_GAIN_FROM_FOOD, ENERGY_LOSS_PER_DAY/ROUND_DURATION)
+                if self.observers:
+                    self.set_player_state(x, y, energy)
+                    self.notify_tick(round, stop - 1)
+                tick = stop
+        self.set_player_state(x, y, energy)
+        self.env.food.clear()
+
+    def new_kernel_rng(self):
+        return numpy_rng(self.rng)
+
+    def player_state(self):
+        return (np.array([player.x for player in self.players], dtype=np.int64),
+                np.array([player.y for player in self.players], dtype=np.int64),
+                np.array([player.energy for player in self.players], dtype=np.float64))
+
+    def set_player_state(self, x, y, energy):
+        for player, player_x, player_y, player_energy in zip(self.players, x.tolist(), y.tolist(), energy.tolist()):
+            player.x = player_x
+            player.y = player_y
+            player.energy = player_energy
 
     def night_phase(self):
         for night in range(NIGHT_LENGTH):
@@ -159,36 +247,38 @@ class Simulation:
     def cull(self):
         dead_players = 0
         new_players = []
-        total_fitness = sum(player.fitness for player in self.players)
+        removed_players = []
+        total_fitness = self.players.total_fitness
     
         for player in self.players:
             survival_probability = player.fitness*20 / total_fitness
             # print(survival_probability,random.random())
             # print(player.fitness)
             # print(player.energy,player.genome)
-            if player.energy < player.energy_required_for_living or random.random() > survival_probability:
+            if player.energy < player.energy_required_for_living or self.rng.random() > survival_probability:
                 dead_players += 1
+                removed_players.append(player)
                 # print("dead")
             else:
                 new_players.append(player)
                 # print("append")
-        self.players = new_players
+        self.players.replace(new_players, removed_players)
         return dead_players
 
     def breed(self):
         player_babies = 0
         new_players = []
 
-        total_fitness = sum(player.fitness for player in self.players)
+        total_fitness = self.players.total_fitness
         
         for player in self.players:
             reproduction_probability = player.fitness*20 / total_fitness
-            if player.energy >= player.energy_required_for_reproduction and random.random() <= reproduction_probability:
+            if player.energy >= player.energy_required_for_reproduction and self.rng.random() <= reproduction_probability:
                 player.energy //= 2
-                genome_sequence =mutate_genome_sequence(player.genome.sequence)
+                genome_sequence =mutate_genome_sequence(player.genome.sequence, self.rng)
                 # print(player.genome.sequence,genome_sequence)
                 genome = Genome(genome_sequence)
-                new_players.append(Agent(random.randint(0, ENV_WIDTH - 1), random.randint(0, ENV_HEIGHT - 1), genome))
+                new_players.append(Agent(self.rng.randint(0, self.env.width - 1), self.rng.randint(0, self.env.height - 1), genome))
                 player_babies += 1
 
         self.players.extend(new_players)
@@ -198,31 +288,287 @@ class Simulation:
     def get_count(self):
         return len(self.players)
     
-    def update_plot(self, round,duration):
-        food_x, food_y = zip(*self.env.food_positions) if self.env.food_positions else ([], [])
-        player_x = [player.x for player in self.players]
-        player_y = [player.y for player in self.players]
+    def player_positions(self):
+        return [player.x for player in self.players], [player.y for player in self.players]
+
+    def notify_tick(self, round, tick):
+        if self.observe_every is None:
+            observed = tick == ROUND_DURATION - 1
+        else:
+            observed = tick % self.observe_every == 0
+        if observed:
+            for observer in self.observers:
+                observer.on_tick(self, round, tick)
+
+    # Checkpointing: snapshot() returns (meta, arrays) describing the state
+    # between two rounds, restore() puts such a state back, so a restored
+    # simulation continues exactly as the original would have.
+    def snapshot(self):
+        meta = {
+            'engine': type(self).__name__,
+            'env_width': self.env.width,
+            'env_height': self.env.height,
+            'rounds': self.rounds,
+            'current_round': self.current_round,
+            'death_count': self.death_count,
+            'breed_count': self.breed_count,
+            'genome_length': GENOME_LENGTH,
+            'food_eaten': self.env.food.eaten,
+            'food_discarded': self.env.food.discarded,
+            'rng': checkpoint.rng_state(self.rng),
+            'env_rng': checkpoint.rng_state(self.env.rng),
+            'backend': self.backend,
+            'kernel_rng': checkpoint.rng_state(self.kernel_rng) if self.kernel_rng not in (None, self.rng) else None,
+            'stats': self.stats.summary(),
+        }
+        food_cells, food_counts = self.env.food.stocked()
+        arrays = dict(self.player_columns(),
+                      food_cells=food_cells,
+                      food_counts=food_counts,
+                      graph_player_points=np.array(self.graph_player_points, dtype=np.int64))
+        return meta, arrays
+
+    def restore(self, meta, arrays):
+        self.rounds = meta['rounds']
+        self.current_round = meta['current_round']
+        self.death_count = meta['death_count']
+        self.breed_count = meta['breed_count']
+        self.rng = checkpoint.restore_rng(meta['rng'])
+        self.env.rng = checkpoint.restore_rng(meta['env_rng'])
+        if meta['kernel_rng'] is not None:
+            self.kernel_rng = checkpoint.restore_rng(meta['kernel_rng'])
+        elif self.backend != 'python':
+            self.kernel_rng = self.new_kernel_rng()
+        self.stats.phase_seconds.update(meta['stats']['phase_seconds'])
+        self.stats.counters.update(meta['stats']['counters'])
+
+        self.env.food.set_cells(arrays['food_cells'], arrays['food_counts'])
+        self.env.food.eaten = meta['food_eaten']
+        self.env.food.discarded = meta['food_discarded']
+
+        self.players = self.players_from_columns(arrays, meta['genome_length'])
+        self.graph_player_points = arrays['graph_player_points'].tolist()
+
+    def player_columns(self):
+        sequences = [player.genome.sequence for player in self.players]
+        return {
+            'x': np.array([player.x for player in self.players], dtype=np.int64),
+            'y': np.array([player.y for player in self.players], dtype=np.int64),
+            'energy': np.array([player.energy for player in self.players], dtype=np.float64),
+            'genome': encode_sequences(sequences) if sequences else np.zeros((0, packed_length(GENOME_LENGTH)), dtype=np.uint8),
+        }
+
+    def players_from_columns(self, arrays, genome_length):
+        players_list = []
+        sequences = decode_sequences(arrays['genome'], genome_length)
+        for x, y, energy, sequence in zip(arrays['x'].tolist(), arrays['y'].tolist(), arrays['energy'].tolist(), sequences):
+            player = Agent(x, y, Genome(sequence))
+            player.energy = energy
+            players_list.append(player)
+        return Population(players_list)
+
+def resume(path, observers=(), observe_every=1, stats=None):
+    # Rebuilds the simulation saved at path by a Checkpointer
+    meta, arrays = checkpoint.load(path)
+    engine = {'Simulation': Simulation, 'ArraySimulation': ArraySimulation,
+              'ShardedSimulation': ShardedSimulation}[meta['engine']]
+    options = {'tiles': tuple(meta['tiles'])} if 'tiles' in meta else {}
+    simulation = engine(meta['env_width'], meta['env_height'], 0, meta['rounds'], observers, observe_every,
+                        rng=checkpoint.restore_rng(meta['rng']), stats=stats, backend=meta['backend'], **options)
+    simulation.restore(meta, arrays)
+    return simulation
+
+class Observer:
+    def on_start(self, simulation):
+        pass
+
+    def on_tick(self, simulation, round, tick):
+        pass
+
+    def on_round(self, simulation, round):
+        pass
+
+    def on_finish(self, simulation):
+        pass
+
+class LivePlot(Observer):
+    # Interactive scatter of food and players, plus the population curve at the end
+    def __init__(self, pause=0.01):
+        from matplotlib import pyplot as plt
+        self.plt = plt
+        self.pause = pause
+        plt.ion()
+        self.fig, self.ax = plt.subplots(figsize=(8, 8))
+        self.ax.set_xlim(0, ENV_WIDTH)
+        self.ax.set_ylim(0, ENV_HEIGHT)
+        self.food_scatter = self.ax.scatter([], [], c='green', label='Food', marker='*')
+        self.player_scatter = self.ax.scatter([], [], c='blue', label='Players', marker='x')
+        self.ax.legend()
+        self.ax.grid()
+
+    def on_tick(self, simulation, round, tick):
+        food_positions = simulation.env.food_positions
+        food_x, food_y = zip(*food_positions) if food_positions else ([], [])
+        player_x, player_y = simulation.player_positions()
 
         self.food_scatter.set_offsets(list(zip(food_x, food_y)))
         self.player_scatter.set_offsets(list(zip(player_x, player_y)))
         self.ax.set_title(f"ROUND {round}")
-        self.fig.suptitle(f"TIME {duration}")
+        self.fig.suptitle(f"TIME {tick}")
 
         # Redraw the figure
         self.fig.canvas.draw()
         self.fig.canvas.flush_events()
-        time.sleep(0.01)
+        time.sleep(self.pause)
+
+    def on_finish(self, simulation):
+        self.plt.plot(simulation.graph_player_points, label="players")
+        self.plt.xlabel("Rounds")
+        self.plt.ylabel("Population")
+        self.plt.legend()
+        self.plt.show()
+        self.plt.ioff()  # Turn off interactive mode after simulation is done
+        self.plt.show()
 
-    def plot_results(self):
-        plt.plot(self.graph_player_points, label="players")
-        plt.xlabel("Rounds")
-        plt.ylabel("Population")
-        plt.legend()
-        plt.show()
+class Checkpointer(Observer):
+    # Saves the simulation to path every `every` rounds and after the last one.
+    # The file is written on a background thread while the next round runs.
+    def __init__(self, path, every=1):
+        self.writer = checkpoint.CheckpointWriter(path)
+        self.every = every
+
+    def on_round(self, simulation, round):
+        if round % self.every == 0:
+            self.writer.write(*simulation.snapshot())
+
+    def on_finish(self, simulation):
+        self.writer.write(*simulation.snapshot())
+        self.writer.wait()
+
+class ArraySimulation(Simulation):
+    # Players are kept in an AgentArray, so every phase runs as whole-population
+    # array operations instead of a Python loop over Agent objects. The
+    # 'numba' (or 'auto') and 'events' backends swap the per-tick day loop for
+    # a kernel; 'numpy' keeps the loop below.
+    def __init__(self, env_width, env_height, starting_players, rounds, observers=(), observe_every=1, rng=None, stats=None,
+                 backend='numpy'):
+        rng = rng if rng is not None else np.random.default_rng()
+        super().__init__(env_width, env_height, starting_players, rounds, observers, observe_every, rng=rng, stats=stats,
+                         backend=backend)
+
+    def init_players(self, players):
+        return AgentArray.random(players, self.env.width, self.env.height, STARTING_ENERGY, GENOME_LENGTH, self.rng)
+
+    def new_kernel_rng(self):
+        return self.rng
+
+    def player_state(self):
+        return self.players.x, self.players.y, self.players.energy
+
+    def set_player_state(self, x, y, energy):
+        self.players.x = x
+        self.players.y = y
+        self.players.energy = energy
+
+    def day_phase(self,round):
+        if self.backend in ('numba', 'events'):
+            return self.kernel_day_phase(round)
+        for start_time in range(1, ROUND_DURATION):
+            self.players.move(self.env.width, self.env.height, self.rng)
+            self.players.eat(self.env.food, ENERGY_GAIN_FROM_FOOD)
+            self.players.lose_energy(ENERGY_LOSS_PER_DAY/ROUND_DURATION)
+            self.notify_tick(round,start_time)
+        self.env.food.clear()
+
+    def night_phase(self):
+        for night in range(NIGHT_LENGTH):
+            self.players.lose_energy(ENERGY_LOSS_PER_NIGHT/NIGHT_LENGTH)
+
+    def cull(self):
+        return self.players.cull(BASE_ENERGY_REQUIRED_FOR_LIVING, self.rng)
+
+    def breed(self):
+        return self.players.breed(BASE_ENERGY_REQUIRED_FOR_REPRODUCTION, self.env.width, self.env.height,
+                                  STARTING_ENERGY, MUTATION_PROBABILITY, self.rng)
+
+    def player_positions(self):
+        return self.players.x, self.players.y
+
+    def player_columns(self):
+        return {'x': self.players.x.copy(), 'y': self.players.y.copy(),
+                'energy': self.players.energy.copy(), 'genome': self.players.genome.copy()}
+
+    def players_from_columns(self, arrays, genome_length):
+        return AgentArray(arrays['x'], arrays['y'], arrays['energy'], arrays['genome'], genome_length)
+
+class ShardedSimulation(ArraySimulation):
+    # ArraySimulation whose day phase is split over worker processes, each
+    # owning one tile of the grid (see sharded.py); night, cull and breed stay
+    # in this process. workers defaults to one per CPU, tiles to the split
+    # with the shortest borders. The day runs in the workers from start to
+    # end, so observers only see its last tick. Call close() (run() does it)
+    # to stop the workers.
+    def __init__(self, env_width, env_height, starting_players, rounds, observers=(), observe_every=1, rng=None, stats=None,
+                 backend='numpy', workers=None, tiles=None):
+        super().__init__(env_width, env_height, starting_players, rounds, observers, observe_every, rng=rng, stats=stats,
+                         backend=backend)
+        if workers is None:
+            workers = tiles[0] * tiles[1] if tiles is not None else os.cpu_count()
+        self.pool = ShardPool(env_width, env_height, workers, tiles)
+
+    def run(self, verbose=False):
+        try:
+            super().run(verbose)
+        finally:
+            self.close()
+
+    def close(self):
+        self.pool.close()
+
+    def day_phase(self,round):
+        # The workers' generators come from a seed drawn from rng, not from
+        # rng.spawn(), whose spawn count a checkpoint would not keep
+        seeds = child_seeds(int(self.rng.integers(2**63)), self.pool.workers)
+        self.pool.run_day(self.players.x, self.players.y, self.players.energy, self.env.food, ROUND_DURATION - 1,
+                          ENERGY_GAIN_FROM_FOOD, ENERGY_LOSS_PER_DAY/ROUND_DURATION, [numpy_rng(seed) for seed in seeds])
+        for observer in self.observers:
+            observer.on_tick(self, round, ROUND_DURATION - 1)
+        self.env.food.clear()
+
+    def snapshot(self):
+        meta, arrays = super().snapshot()
+        meta['tiles'] = [self.pool.tiling.tiles_x, self.pool.tiling.tiles_y]
+        return meta, arrays
 
 if __name__ == "__main__":
-    simulation = Simulation(ENV_WIDTH, ENV_HEIGHT, STARTING_PLAYERS, ROUNDS)
-    # Turn on interactive mod
-    simulation.run()
-    plt.ioff()  # Turn off interactive mode after simulation is done
-    plt.show()
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Run the natural selection simulation.')
+    parser.add_argument('--engine', choices=['Simulation', 'ArraySimulation', 'ShardedSimulation'], default='Simulation')
+    parser.add_argument('--workers', type=int, help='worker processes for ShardedSimulation (default: one per CPU)')
+    parser.add_argument('--rounds', type=int, default=ROUNDS)
+    parser.add_argument('--seed', type=int)
+    parser.add_argument('--headless', action='store_true', help='run without the live plot')
+    parser.add_argument('--checkpoint', help='file to save a checkpoint to while running')
+    parser.add_argument('--checkpoint-every', type=int, default=1, help='rounds between checkpoints')
+    parser.add_argument('--resume', help='checkpoint file to continue from')
+    parser.add_argument('--trajectory', help='file to record positions and food to, for trajectory.py to replay')
+    parser.add_argument('--trajectory-every', type=int, default=1, help='ticks between recorded ticks')
+    args = parser.parse_args()
+
+    observers = [] if args.headless else [LivePlot()]
+    if args.checkpoint:
+        observers.append(Checkpointer(args.checkpoint, args.checkpoint_every))
+    if args.trajectory:
+        from trajectory import TrajectoryRecorder
+        observers.append(TrajectoryRecorder(args.trajectory, ENV_WIDTH, ENV_HEIGHT, args.trajectory_every))
+    if args.resume:
+        simulation = resume(args.resume, observers)
+        simulation.rounds = max(simulation.rounds, args.rounds)
+    else:
+        engine = {'Simulation': Simulation, 'ArraySimulation': ArraySimulation,
+                  'ShardedSimulation': ShardedSimulation}[args.engine]
+        rng = python_rng(args.seed) if args.engine == 'Simulation' else np.random.default_rng(args.seed)
+        options = {'workers': args.workers} if args.engine == 'ShardedSimulation' else {}
+        simulation = engine(ENV_WIDTH, ENV_HEIGHT, STARTING_PLAYERS, args.rounds, observers=observers, rng=rng, **options)
+    simulation.run(verbose=True)
@@ -0,0 +1,75 @@
+import numpy as np
+
+# numpy's hypergeometric sampler only accepts populations smaller than this
+MAX_EXACT_POPULATION = 10**9
+
+def hypergeometric(rng, ngood, nbad, nsample):
+    total = ngood + nbad
+    if total < MAX_EXACT_POPULATION:
+        return int(rng.hypergeometric(ngood, nbad, nsample))
+
+    # Beyond numpy's limit the hypergeometric is indistinguishable from a normal
+    # with the same mean and variance, clipped to the feasible range
+    mean = nsample * ngood / total
+    variance = mean * (nbad / total) * (total - nsample) / (total - 1)
+    draw = round(rng.normal(mean, variance ** 0.5))
+    return min(max(draw, nsample - nbad, 0), ngood, nsample)
+
+def sample_pair_counts(num_hawks, num_doves, rng):
+    # Number of Hawk/Hawk, Hawk/Dove and Dove/Dove pairs formed when the
+    # population is shuffled and paired off, without shuffling anyone.
+    total = num_hawks + num_doves
+    if total % 2:
+        # The odd one out sits the round out
+        if rng.random() < num_hawks / total:
+            num_hawks -= 1
+        else:
+            num_doves -= 1
+    num_pairs = (num_hawks + num_doves) // 2
+
+    # Hawks in the first seat of each pair, then how many of those are joined
+    # by one of the remaining hawks in the second seat
+    first_hawks = hypergeometric(rng, num_hawks, num_doves, num_pairs)
+    second_hawks = num_hawks - first_hawks
+    hawk_hawk = hypergeometric(rng, second_hawks, num_pairs - second_hawks, first_hawks)
+
+    hawk_dove = num_hawks - 2 * hawk_hawk
+    dove_dove = num_pairs - hawk_hawk - hawk_dove
+    return hawk_hawk, hawk_dove, dove_dove
+
+def hypergeometric_batch(rng, ngood, nbad, nsample):
+    # Element-wise hypergeometric over arrays, with the same normal fallback
+    # as hypergeometric for populations beyond numpy's limit
+    ngood, nbad, nsample = np.broadcast_arrays(ngood, nbad, nsample)
+    total = ngood + nbad
+    exact = total < MAX_EXACT_POPULATION
+    draws = np.zeros(total.shape, dtype=np.int64)
+    draws[exact] = rng.hypergeometric(ngood[exact], nbad[exact], nsample[exact])
+    if not exact.all():
+        good, bad, sample = ngood[~exact], nbad[~exact], nsample[~exact]
+        big = total[~exact].astype(np.float64)
+        mean = sample.astype(np.float64) * good / big
+        variance = mean * (bad / big) * (big - sample) / (big - 1)
+        draw = np.round(rng.normal(mean, np.sqrt(variance))).astype(np.int64)
+        draws[~exact] = np.minimum(np.maximum(draw, np.maximum(sample - bad, 0)), np.minimum(good, sample))
+    return draws
+
+def sample_pair_counts_batch(num_hawks, num_doves, rng):
+    # sample_pair_counts for many independent populations at once; takes and
+    # returns int64 arrays with one entry per population
+    num_hawks = np.asarray(num_hawks, dtype=np.int64)
+    num_doves = np.asarray(num_doves, dtype=np.int64)
+    total = num_hawks + num_doves
+    odd = total % 2 == 1
+    hawk_sits_out = odd & (rng.random(total.shape) * total < num_hawks)
+    num_hawks = num_hawks - hawk_sits_out
+    num_doves = num_doves - (odd & ~hawk_sits_out)
+    num_pairs = (num_hawks + num_doves) // 2
+
+    first_hawks = hypergeometric_batch(rng, num_hawks, num_doves, num_pairs)
+    second_hawks = num_hawks - first_hawks
+    hawk_hawk = hypergeometric_batch(rng, second_hawks, num_pairs - second_hawks, first_hawks)
+
+    hawk_dove = num_hawks - 2 * hawk_hawk
+    dove_dove = num_pairs - hawk_hawk - hawk_dove
+    return hawk_hawk, hawk_dove, dove_dove
@@ -0,0 +1,279 @@
+import os
+import queue
+import shutil
+import subprocess
+import threading
+
+import numpy as np
+
+# Offscreen rendering of the spatial simulations: food and agents are painted
+# as scale x scale squares straight into a reused palette-index buffer (no
+# matplotlib artists), and finished frames are encoded to a GIF or MP4 on a
+# background thread while the simulation keeps running.
+
+# Colour names the simulations use, as RGB; index 0 is the background
+PALETTE_COLORS = {
+    'white': (255, 255, 255),
+    'green': (0, 128, 0),
+    'blue': (0, 0, 255),
+    'red': (255, 0, 0),
+    'yellow': (255, 255, 0),
+    'purple': (128, 0, 128),
+    'black': (0, 0, 0),
+    'gray': (128, 128, 128),
+}
+
+class FrameRenderer:
+    def __init__(self, width, height, scale=4, colors=PALETTE_COLORS):
+        self.width = width
+        self.height = height
+        self.scale = scale
+        self.color_index = {name: index for index, name in enumerate(colors)}
+        self.palette = np.array(list(colors.values()), dtype=np.uint8)
+        self.frame = np.zeros((height * scale, width * scale), dtype=np.uint8)
+        self.rgb = np.zeros((height * scale, width * scale, 3), dtype=np.uint8)
+        # The frame seen as (row, pixel row, column, pixel column): cell (x, y)
+        # is cells[height - 1 - y, :, x, :], so y grows upwards as in the plots
+        self.cells = self.frame.reshape(height, scale, width, scale)
+
+    def render(self, layers):
+        # layers is a list of (x array, y array, colour name), painted in order
+        self.frame.fill(0)
+        for x, y, color in layers:
+            x = np.asarray(x, dtype=np.int64)
+            y = np.asarray(y, dtype=np.int64)
+            self.cells[self.height - 1 - y, :, x, :] = self.color_index[color]
+        return self.frame
+
+    def to_rgb(self):
+        np.take(self.palette, self.frame, axis=0, out=self.rgb)
+        return self.rgb
+
+def lzw_encode(pixels, min_code_size):
+    # GIF-flavoured LZW of a bytes object of palette indices
+    clear = 1 << min_code_size
+    end = clear + 1
+    code_size = min_code_size + 1
+    next_code = end + 1
+    table = {}
+    output = bytearray()
+    buffer = 0
+    buffered_bits = 0
+
+    def emit(code):
+        nonlocal buffer, buffered_bits
+        buffer |= code << buffered_bits
+        buffered_bits += code_size
+        while buffered_bits >= 8:
+            output.append(buffer & 0xFF)
+            buffer >>= 8
+            buffered_bits -= 8
+
+    emit(clear)
+    prefix = pixels[0]
+    for pixel in pixels[1:]:
+        key = prefix << 8 | pixel
+        code = table.get(key)
+        if code is not None:
+            prefix = code
+            continue
+        emit(prefix)
+        if next_code == 4096:
+            emit(clear)
+            table.clear()
+            code_size = min_code_size + 1
+            next_code = end + 1
+        else:
+            table[key] = next_code
+            if next_code == 1 << code_size:
+                code_size += 1
+            next_code += 1
+        prefix = pixel
+    emit(prefix)
+    emit(end)
+    if buffered_bits:
+        output.append(buffer & 0xFF)
+    return bytes(output)
+
+class GifEncoder:
+    # Minimal animated GIF89a writer for frames of palette indices
+    def __init__(self, file, width, height, palette, fps=20):
+        self.file = file
+        self.width = width
+        self.height = height
+        self.frames = 0
+        self.delay = max(round(100 / fps), 1)
+        table_bits = max(int(np.ceil(np.log2(len(palette)))), 1)
+        self.min_code_size = max(table_bits, 2)
+        table = np.zeros((1 << table_bits, 3), dtype=np.uint8)
+        table[:len(palette)] = palette
+
+        file.write(b'GIF89a')
+        file.write(width.to_bytes(2, 'little') + height.to_bytes(2, 'little'))
+        file.write(bytes([0xF0 | (table_bits - 1), 0, 0]))
+        file.write(table.tobytes())
+        file.write(b'\x21\xFF\x0BNETSCAPE2.0\x03\x01\x00\x00\x00')  # loop forever
+
+    def write(self, frame):
+        file = self.file
+        file.write(b'\x21\xF9\x04\x00' + self.delay.to_bytes(2, 'little') + b'\x00\x00')
+        file.write(b'\x2C\x00\x00\x00\x00' + self.width.to_bytes(2, 'little') + self.height.to_bytes(2, 'little') + b'\x00')
+        file.write(bytes([self.min_code_size]))
+        self.frames += 1
+        data = lzw_encode(frame.tobytes(), self.min_code_size)
+        for start in range(0, len(data), 255):
+            block = data[start:start + 255]
+            file.write(bytes([len(block)]) + block)
+        file.write(b'\x00')
+
+    def close(self):
+        # A GIF without an image is not valid, so none is left behind
+        if self.frames == 0:
+            self.file.close()
+            os.remove(self.file.name)
+            raise RuntimeError(f'no frames were recorded, {self.file.name} not written')
+        self.file.write(b'\x3B')
+        self.file.close()
+
+class Mp4Encoder:
+    # Pipes RGB frames to ffmpeg, which has to be on the PATH
+    def __init__(self, path, width, height, palette, fps=20):
+        ffmpeg = shutil.which('ffmpeg')
+        if ffmpeg is None:
+            raise RuntimeError('writing MP4 needs ffmpeg on the PATH')
+        self.path = path
+        self.palette = palette
+        self.frames = 0
+        self.rgb = np.empty((height, width, 3), dtype=np.uint8)
+        self.process = subprocess.Popen(
+            [ffmpeg, '-loglevel', 'error', '-y', '-f', 'rawvideo', '-pix_fmt', 'rgb24', '-s', f'{width}x{height}',
+             '-r', str(fps), '-i', '-', '-pix_fmt', 'yuv420p', '-vf', 'pad=ceil(iw/2)*2:ceil(ih/2)*2', path],
+            stdin=subprocess.PIPE)
+
+    def write(self, frame):
+        np.take(self.palette, frame, axis=0, out=self.rgb)
+        self.process.stdin.write(self.rgb.tobytes())
+        self.frames += 1
+
+    def close(self):
+        self.process.stdin.close()
+        if self.frames == 0:
+            self.process.wait()
+            if os.path.exists(self.path):
+                os.remove(self.path)
+            raise RuntimeError(f'no frames were recorded, {self.path} not written')
+        if self.process.wait() != 0:
+            raise RuntimeError(f'ffmpeg exited with status {self.process.returncode}')
+
+def open_encoder(path, width, height, palette, fps=20):
+    if path.endswith('.mp4'):
+        return Mp4Encoder(path, width, height, palette, fps)
+    return GifEncoder(open(path, 'wb'), width, height, palette, fps)
+
+class BackgroundWriter:
+    # Hands frames to an encoder running on its own thread. At most max_queued
+    # frames wait at once, so a slow encoder slows the simulation down instead
+    # of piling frames up in memory. Errors surface on the next write or close.
+    def __init__(self, encoder, max_queued=32):
+        self.encoder = encoder
+        self.frames = queue.Queue(max_queued)
+        self.error = None
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def write(self, frame):
+        if self.error is not None:
+            raise self.error
+        self.frames.put(frame.copy())
+
+    def close(self):
+        self.frames.put(None)
+        self.thread.join()
+        if self.error is not None:
+            raise self.error
+
+    def _run(self):
+        try:
+            while True:
+                frame = self.frames.get()
+                if frame is None:
+                    break
+                self.encoder.write(frame)
+        except Exception as error:
+            self.error = error
+            while self.frames.get() is not None:
+                pass
+        finally:
+            try:
+                self.encoder.close()
+            except Exception as error:
+                self.error = self.error or error
+
+class Recorder:
+    # Observer that renders the food and the players to path (.gif or .mp4)
+    # every `every` ticks. Players are coloured by player_positions_by_color()
+    # when the simulation has it, and drawn blue otherwise.
+    def __init__(self, path, width, height, every=1, scale=4, fps=20):
+        self.renderer = FrameRenderer(width, height, scale)
+        self.every = every
+        frame_height, frame_width = self.renderer.frame.shape
+        self.writer = BackgroundWriter(open_encoder(path, frame_width, frame_height, self.renderer.palette, fps))
+
+    def layers(self, simulation):
+        food = simulation.env.food
+        food_x, food_y = np.divmod(food.stocked()[0], food.height)
+        layers = [(food_x, food_y, 'green')]
+        if hasattr(simulation, 'player_positions_by_color'):
+            for color, (x, y) in simulation.player_positions_by_color().items():
+                layers.append((x, y, color))
+        else:
+            x, y = simulation.player_positions()
+            layers.append((x, y, 'blue'))
+        return layers
+
+    def on_start(self, simulation):
+        pass
+
+    def on_tick(self, simulation, round, tick):
+        if tick % self.every == 0:
+            self.write_frame(simulation)
+
+    def write_frame(self, simulation):
+        # Renders the simulation as it is now, for scripts that record once per round
+        self.writer.write(self.renderer.render(self.layers(simulation)))
+
+    def on_round(self, simulation, round):
+        pass
+
+    def on_finish(self, simulation):
+        self.writer.close()
+
+if __name__ == "__main__":
+    import argparse
+    import random
+
+    from script_loader import load_script
+
+    parser = argparse.ArgumentParser(description='Record a simulation to a GIF or MP4 without a GUI.')
+    parser.add_argument('output', help='.gif or .mp4 file')
+    parser.add_argument('--script', default='naturalselection.py',
+                        choices=['naturalselection.py', 'animationv2.py', 'with_animation.py'])
+    parser.add_argument('--engine', default='Simulation', choices=['Simulation', 'ArraySimulation'])
+    parser.add_argument('--rounds', type=int, default=3)
+    parser.add_argument('--every', type=int, default=10, help='ticks between frames')
+    parser.add_argument('--scale', type=int, default=4, help='pixels per grid cell')
+    parser.add_argument('--fps', type=int, default=20)
+    parser.add_argument('--seed', type=int)
+    args = parser.parse_args()
+
+    module = load_script(args.script)
+    rng = np.random.default_rng(args.seed) if args.engine == 'ArraySimulation' else random.Random(args.seed)
+    recorder = Recorder(args.output, module.ENV_WIDTH, module.ENV_HEIGHT, args.every, args.scale, args.fps)
+    if args.script == 'naturalselection.py':
+        simulation = getattr(module, args.engine)(module.ENV_WIDTH, module.ENV_HEIGHT, module.STARTING_PLAYERS,
+                                                  args.rounds, observers=[recorder], rng=rng)
+        simulation.run()
+    else:
+        simulation = getattr(module, args.engine)(module.ENV_WIDTH, module.ENV_HEIGHT, module.STARTING_PLAYERS,
+                                                  args.rounds, rng=rng)
+        simulation.record(recorder)
@@ -0,0 +1,134 @@
+import itertools
+
+import numpy as np
+
+# Deterministic (mean-field) counterparts of the stochastic simulations for
+# symmetric two-player games. payoffs[i, j] is what a player using strategy i
+# gets against strategy j; in the Hawk/Dove scripts that is the expected
+# number of individuals of its type it leaves in the next round.
+
+STRATEGIES = ('Hawk', 'Dove')
+# Hawk&Dove.py: a hawk beating a dove leaves 2, each dove of a Dove/Dove pair
+# leaves 1, Hawk/Hawk pairs and beaten doves leave nothing
+HAWK_DOVE_PAYOFFS = np.array([[0, 2], [0, 1]])
+# Hawk&Dove_improved.py: the hawk of a Hawk/Dove pair survives and adds a baby
+# hawk half the time, the dove dies but adds a baby dove half the time
+HAWK_DOVE_IMPROVED_PAYOFFS = np.array([[0, 1.5], [0.5, 1]])
+
+def payoff_table(payoff_matrix):
+    # basic_game's {(action1, action2): (utility1, utility2)} -> (actions, payoffs)
+    actions = sorted({action for pair in payoff_matrix for action in pair})
+    payoffs = np.array([[payoff_matrix[(action1, action2)][0] for action2 in actions] for action1 in actions])
+    mirrored = np.array([[payoff_matrix[(action2, action1)][1] for action2 in actions] for action1 in actions])
+    if not np.array_equal(payoffs, mirrored):
+        raise ValueError('replicator dynamics need a symmetric game')
+    return actions, payoffs
+
+def discrete_step(counts, payoffs):
+    # Expected counts next round when everyone is paired at random: each
+    # strategy multiplies by its average payoff against the current mix
+    counts = np.asarray(counts, dtype=np.float64)
+    total = counts.sum()
+    if total == 0:
+        return counts
+    return counts * (payoffs @ (counts / total))
+
+def discrete_trajectory(counts, payoffs, rounds):
+    # (rounds + 1, strategies) expected counts, starting with counts
+    trajectory = np.empty((rounds + 1, len(payoffs)))
+    trajectory[0] = counts
+    for round in range(rounds):
+        trajectory[round + 1] = discrete_step(trajectory[round], payoffs)
+    return trajectory
+
+def replicator_rate(frequencies, payoffs):
+    # dx_i/dt = x_i ((Ax)_i - x.Ax)
+    fitness = payoffs @ frequencies
+    return frequencies * (fitness - frequencies @ fitness)
+
+def integrate(frequencies, payoffs, duration, dt=0.01):
+    # Replicator ODE with fixed-step RK4; returns (times, frequencies per time)
+    steps = int(np.ceil(duration / dt))
+    times = np.linspace(0, steps * dt, steps + 1)
+    trajectory = np.empty((steps + 1, len(payoffs)))
+    trajectory[0] = frequencies
+    x = trajectory[0]
+    for step in range(steps):
+        k1 = replicator_rate(x, payoffs)
+        k2 = replicator_rate(x + dt / 2 * k1, payoffs)
+        k3 = replicator_rate(x + dt / 2 * k2, payoffs)
+        k4 = replicator_rate(x + dt * k3, payoffs)
+        x = x + dt / 6 * (k1 + 2 * k2 + 2 * k3 + k4)
+        trajectory[step + 1] = x
+    return times, trajectory
+
+def nash_equilibria(payoffs, tol=1e-9):
+    # Symmetric Nash equilibria by support enumeration: on the support every
+    # strategy earns the same payoff v and nothing outside it earns more
+    payoffs = np.asarray(payoffs, dtype=np.float64)
+    size = len(payoffs)
+    equilibria = []
+    for support_size in range(1, size + 1):
+        for support in itertools.combinations(range(size), support_size):
+            support = list(support)
+            # payoffs[S, S] x_S - v = 0, sum(x_S) = 1
+            system = np.zeros((support_size + 1, support_size + 1))
+            system[:support_size, :support_size] = payoffs[np.ix_(support, support)]
+            system[:support_size, -1] = -1
+            system[-1, :support_size] = 1
+            target = np.zeros(support_size + 1)
+            target[-1] = 1
+            solution, _, rank, _ = np.linalg.lstsq(system, target, rcond=None)
+            if rank < support_size + 1 or np.any(solution[:support_size] < -tol):
+                continue
+            x = np.zeros(size)
+            x[support] = np.clip(solution[:support_size], 0, None)
+            fitness = payoffs @ x
+            if fitness.max() <= x @ fitness + tol and not any(np.allclose(x, other) for other in equilibria):
+                equilibria.append(x)
+    return equilibria
+
+def is_ess(payoffs, x, tol=1e-9):
+    # A Nash equilibrium x is evolutionarily stable if every mutant mix z of
+    # its best replies does worse against itself: z.Az < 0 for z summing to 0.
+    # Exact for two strategies and whenever every best reply is in x's support.
+    payoffs = np.asarray(payoffs, dtype=np.float64)
+    fitness = payoffs @ x
+    best_replies = np.flatnonzero(fitness >= fitness.max() - tol)
+    if len(best_replies) == 1:
+        return True
+    # Directions e_b - e_b0 span the mutant mixes over the best replies
+    directions = np.zeros((len(payoffs), len(best_replies) - 1))
+    directions[best_replies[0]] = -1
+    directions[best_replies[1:], np.arange(len(best_replies) - 1)] = 1
+    symmetric = (payoffs + payoffs.T) / 2
+    return bool(np.all(np.linalg.eigvalsh(directions.T @ symmetric @ directions) < -tol))
+
+def evolutionarily_stable_states(payoffs, tol=1e-9):
+    return [x for x in nash_equilibria(payoffs, tol) if is_ess(payoffs, x, tol)]
+
+if __name__ == "__main__":
+    payoff_matrix = {
+        ('A', 'A'): (3, 3),
+        ('A', 'B'): (0, 5),
+        ('B', 'A'): (5, 0),
+        ('B', 'B'): (1, 1),
+    }
+    actions, basic_game_payoffs = payoff_table(payoff_matrix)
+    games = [
+        ('Hawk&Dove.py', STRATEGIES, HAWK_DOVE_PAYOFFS),
+        ('Hawk&Dove_improved.py', STRATEGIES, HAWK_DOVE_IMPROVED_PAYOFFS),
+        ('basic_game.py', actions, basic_game_payoffs),
+    ]
+    for name, strategies, payoffs in games:
+        print(name)
+        for x in nash_equilibria(payoffs):
+            mix = ', '.join(f'{strategy} {share:.3f}' for strategy, share in zip(strategies, x))
+            print(f"  Nash: {mix}{'  (ESS)' if is_ess(payoffs, x) else ''}")
+        _, trajectory = integrate(np.full(len(payoffs), 1 / len(payoffs)), payoffs, duration=50)
+        print(f"  ODE from an even mix after t=50: {np.round(trajectory[-1], 3)}")
+
+    trajectory = discrete_trajectory([1, 1000], HAWK_DOVE_IMPROVED_PAYOFFS, 30)
+    print("Hawk&Dove_improved.py expected counts from 1 hawk, 1000 doves:")
+    for round in (1, 10, 20, 30):
+        print(f"  Round {round}: Hawks = {trajectory[round, 0]:.1f}, Doves = {trajectory[round, 1]:.1f}")
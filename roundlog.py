@@ -0,0 +1,118 @@
+import csv
+import json
+
+import numpy as np
+
+# Per-round records are flat dicts of ints, e.g. {'round': 3, 'hawks': 40, 'doves': 61}.
+# A sink is a callable taking one record, with flush() to push out anything
+# it buffered; the round loops call every sink once per round and flush them
+# when the run ends. Sinks never close the files they are given.
+
+class RoundHistory:
+    # Keeps every record in memory, one list per field, e.g. for plotting
+    def __init__(self):
+        self.columns = {}
+
+    def __call__(self, record):
+        for name, value in record.items():
+            self.columns.setdefault(name, []).append(value)
+
+    def __getitem__(self, name):
+        return self.columns.get(name, [])
+
+    def flush(self):
+        pass
+
+class PrintSink:
+    # Prints each record through a format string, e.g. "Round {round}: Hawks = {hawks}"
+    def __init__(self, template):
+        self.template = template
+
+    def __call__(self, record):
+        print(self.template.format(**record))
+
+    def flush(self):
+        pass
+
+class CsvSink:
+    # Buffers rows and writes them to an open text file buffer_rounds at a time.
+    # The header comes from the first record unless fields is given.
+    def __init__(self, file, fields=None, buffer_rounds=1024):
+        self.file = file
+        self.fields = fields
+        self.buffer_rounds = buffer_rounds
+        self.writer = None
+        self.rows = []
+
+    def __call__(self, record):
+        self.rows.append(record)
+        if len(self.rows) >= self.buffer_rounds:
+            self.flush()
+
+    def flush(self):
+        if self.rows and self.writer is None:
+            self.writer = csv.DictWriter(self.file, fieldnames=self.fields or list(self.rows[0]))
+            self.writer.writeheader()
+        if self.rows:
+            self.writer.writerows(self.rows)
+            self.rows = []
+        self.file.flush()
+
+# Binary log: a header line b'ROUNDLOG <json field list>\n' followed by one
+# little-endian int64 per field per round. Appending to an existing log with
+# the same fields just adds records.
+BINARY_LOG_MAGIC = b'ROUNDLOG '
+
+class BinaryLogSink:
+    def __init__(self, file, fields, buffer_rounds=4096):
+        self.file = file
+        self.fields = list(fields)
+        self.buffer = np.empty((buffer_rounds, len(self.fields)), dtype='<i8')
+        self.used = 0
+        if file.tell() == 0:
+            file.write(BINARY_LOG_MAGIC + json.dumps(self.fields).encode() + b'\n')
+
+    def __call__(self, record):
+        self.buffer[self.used] = [record[name] for name in self.fields]
+        self.used += 1
+        if self.used == len(self.buffer):
+            self.flush()
+
+    def flush(self):
+        self.file.write(self.buffer[:self.used].tobytes())
+        self.used = 0
+        self.file.flush()
+
+def read_binary_log(path):
+    # Whole log as a structured array with one int64 column per field
+    with open(path, 'rb') as file:
+        header = file.readline()
+        if not header.startswith(BINARY_LOG_MAGIC):
+            raise ValueError(f'{path} is not a round log')
+        fields = json.loads(header[len(BINARY_LOG_MAGIC):])
+        return np.fromfile(file, dtype=[(name, '<i8') for name in fields])
+
+def iter_binary_log(path, chunk_rounds=4096):
+    # Records of a binary log as dicts, reading chunk_rounds records at a time
+    with open(path, 'rb') as file:
+        header = file.readline()
+        if not header.startswith(BINARY_LOG_MAGIC):
+            raise ValueError(f'{path} is not a round log')
+        fields = json.loads(header[len(BINARY_LOG_MAGIC):])
+        dtype = np.dtype([(name, '<i8') for name in fields])
+        while True:
+            chunk = np.fromfile(file, dtype=dtype, count=chunk_rounds)
+            if len(chunk) == 0:
+                return
+            for values in chunk.tolist():
+                yield dict(zip(fields, values))
+
+def write_rounds(records, sinks):
+    # Feeds every record to every sink, flushing them once records run out
+    try:
+        for record in records:
+            for sink in sinks:
+                sink(record)
+    finally:
+        for sink in sinks:
+            sink.flush()
@@ -0,0 +1,19 @@
+import importlib.util
+import os
+import re
+import sys
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+def load_script(filename):
+    # Scripts such as "hawk&Dove_v3.py" can't be imported by name, so load them
+    # from their path and register them as e.g. "hawk_Dove_v3". Registering the
+    # module lets its classes be pickled into worker processes.
+    name = re.sub(r'\W', '_', os.path.splitext(filename)[0])
+    if name in sys.modules:
+        return sys.modules[name]
+    spec = importlib.util.spec_from_file_location(name, os.path.join(ROOT, filename))
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    spec.loader.exec_module(module)
+    return module
@@ -0,0 +1,34 @@
+import random
+
+import numpy as np
+
+# Every simulation takes an explicit rng. The object engines use the random
+# module's interface (random.Random), the array engines a numpy Generator.
+# python_rng/numpy_rng build either kind from an int seed, a SeedSequence or a
+# parent generator of either kind; from a parent they return a child stream.
+
+def child_seeds(seed, count):
+    # Independent, reproducible seed sequences for count jobs
+    return np.random.SeedSequence(seed).spawn(count)
+
+def python_rng(seed=None):
+    if isinstance(seed, np.random.SeedSequence):
+        seed = int.from_bytes(seed.generate_state(4).tobytes(), 'little')
+    elif isinstance(seed, np.random.Generator):
+        seed = int.from_bytes(seed.bytes(16), 'little')
+    elif hasattr(seed, 'getrandbits'):
+        seed = seed.getrandbits(128)
+    return random.Random(seed)
+
+def numpy_rng(seed=None):
+    if isinstance(seed, np.random.Generator):
+        return seed.spawn(1)[0]
+    if hasattr(seed, 'getrandbits'):
+        seed = seed.getrandbits(128)
+    return np.random.default_rng(seed)
+
+def spawn(rng, count):
+    # count child streams of the same kind as rng
+    if isinstance(rng, np.random.Generator):
+        return rng.spawn(count)
+    return [python_rng(rng) for _ in range(count)]
@@ -0,0 +1,288 @@
+import multiprocessing
+import traceback
+from multiprocessing import resource_tracker, shared_memory
+from multiprocessing.connection import wait
+
+import numpy as np
+
+from food import food_store
+
+# Domain-decomposed day phase for the spatial simulations. The torus is cut
+# into tiles_x x tiles_y tiles, each owned by a worker process that steps the
+# agents standing on it and keeps the tile's food. Every tick a worker moves
+# its agents, posts the ones that walked off its tile to a shared migrant
+# buffer, takes in the ones that walked onto it, and lets everyone on the tile
+# eat. A cell belongs to exactly one tile, so contention for food stays local.
+# Agents, food and migrants all travel through shared memory; only the small
+# per-day orders and replies go over pipes.
+#
+# Workers draw their moves from their own generators, so a run is reproducible
+# for a given seed and tiling, but not the same run as the single-process
+# engines (food on a shared cell goes to the agents in a different order).
+
+# Columns of a migrant row: global index, x, y, energy (all exact in float64)
+MIGRANT_COLUMNS = 4
+
+def choose_tiles(workers, width, height):
+    # tiles_x x tiles_y == workers with the least tile border per tile, so
+    # the fewest agents migrate
+    best = None
+    for tiles_x in range(1, workers + 1):
+        if workers % tiles_x or tiles_x > width or workers // tiles_x > height:
+            continue
+        tiles_y = workers // tiles_x
+        border = width / tiles_x + height / tiles_y
+        if best is None or border < best[0]:
+            best = (border, tiles_x, tiles_y)
+    if best is None:
+        raise ValueError(f'cannot split a {width}x{height} grid into {workers} tiles')
+    return best[1], best[2]
+
+class Tiling:
+    def __init__(self, width, height, tiles_x, tiles_y):
+        self.width = width
+        self.height = height
+        self.tiles_x = tiles_x
+        self.tiles_y = tiles_y
+        self.x_edges = np.arange(tiles_x + 1) * width // tiles_x
+        self.y_edges = np.arange(tiles_y + 1) * height // tiles_y
+        # Tile column of every x and tile row of every y
+        self.column = np.repeat(np.arange(tiles_x), np.diff(self.x_edges))
+        self.row = np.repeat(np.arange(tiles_y), np.diff(self.y_edges))
+
+    def __len__(self):
+        return self.tiles_x * self.tiles_y
+
+    def tile_of(self, x, y):
+        return self.column[x] * self.tiles_y + self.row[y]
+
+    def bounds(self, tile):
+        # (x0, y0, tile width, tile height)
+        i, j = divmod(tile, self.tiles_y)
+        return (self.x_edges[i], self.y_edges[j],
+                self.x_edges[i + 1] - self.x_edges[i], self.y_edges[j + 1] - self.y_edges[j])
+
+class SharedArrays:
+    # Named numpy arrays laid out in one shared memory block. spec() is a
+    # small picklable description another process passes to attach().
+    def __init__(self, layout, name=None):
+        # layout is [(key, dtype, shape)]; arrays start 8-byte aligned
+        self.layout = []
+        size = 0
+        for key, dtype, shape in layout:
+            dtype = np.dtype(dtype)
+            self.layout.append((key, dtype.str, tuple(shape), size))
+            size += -(-int(np.prod(shape)) * dtype.itemsize // 8) * 8
+        if name is None:
+            self.memory = shared_memory.SharedMemory(create=True, size=max(size, 8))
+        else:
+            self.memory = shared_memory.SharedMemory(name=name)
+        self.arrays = {key: np.ndarray(shape, dtype=dtype, buffer=self.memory.buf, offset=offset)
+                       for key, dtype, shape, offset in self.layout}
+
+    def __getitem__(self, key):
+        return self.arrays[key]
+
+    def spec(self):
+        return self.memory.name, [(key, dtype, shape) for key, dtype, shape, _ in self.layout]
+
+    @classmethod
+    def attach(cls, spec):
+        name, layout = spec
+        return cls(layout, name=name)
+
+    def close(self):
+        self.arrays = {}
+        self.memory.close()
+
+    def unlink(self):
+        self.close()
+        self.memory.unlink()
+
+class ShardPool:
+    # The worker processes behind a sharded day phase; they are started on
+    # the first day and live until close()
+    def __init__(self, width, height, workers, tiles=None):
+        tiles_x, tiles_y = tiles if tiles is not None else choose_tiles(workers, width, height)
+        if tiles_x * tiles_y != workers:
+            raise ValueError(f'{tiles_x}x{tiles_y} tiles for {workers} workers')
+        self.tiling = Tiling(width, height, tiles_x, tiles_y)
+        self.workers = workers
+        self.connections = []
+        self.processes = []
+        self.barrier = None
+
+    def start(self):
+        # Workers have to share this process's resource tracker; one of their
+        # own would unlink the shared blocks again when the worker exits
+        resource_tracker.ensure_running()
+        context = multiprocessing.get_context()
+        # Kept on the pool: a spawned worker unpickles the barrier only after it
+        # starts, by when the local variable would be gone along with it
+        self.barrier = context.Barrier(self.workers)
+        for tile in range(self.workers):
+            connection, worker_connection = context.Pipe()
+            process = context.Process(target=shard_worker, args=(worker_connection, self.barrier, self.tiling, tile),
+                                      daemon=True)
+            process.start()
+            worker_connection.close()
+            self.connections.append(connection)
+            self.processes.append(process)
+
+    def close(self):
+        for connection in self.connections:
+            try:
+                connection.send(None)
+            except (BrokenPipeError, OSError):
+                pass
+        for process in self.processes:
+            process.join()
+        self.connections = []
+        self.processes = []
+        self.barrier = None
+
+    def run_day(self, x, y, energy, food, ticks, energy_gain, energy_loss, rngs):
+        # Runs ticks ticks of moving and eating over the agent columns and a
+        # food store, in place; rngs holds one numpy Generator per tile
+        if not self.processes:
+            self.start()
+        agents = len(x)
+        food_cells, food_counts = food.stocked()
+        tiles = self.tiling.tile_of(x, y)
+        order = np.argsort(tiles, kind='stable')
+        shared = SharedArrays([
+            ('index', np.int64, (agents,)), ('x', np.int64, (agents,)), ('y', np.int64, (agents,)),
+            ('energy', np.float64, (agents,)), ('tile_starts', np.int64, (self.workers + 1,)),
+            ('x_out', np.int64, (agents,)), ('y_out', np.int64, (agents,)), ('energy_out', np.float64, (agents,)),
+            # Migrants are double-buffered by tick parity, so a worker can post
+            # the next tick's migrants while slower ones still read this tick's
+            ('migrant_counts', np.int64, (2, self.workers)),
+            ('migrants', np.float64, (2, agents, MIGRANT_COLUMNS)),
+            ('food_cells', np.int64, (len(food_cells),)), ('food_counts', np.int64, (len(food_cells),)),
+            ('eaten', np.int64, (self.workers,)),
+        ])
+        try:
+            shared['index'][:] = order
+            shared['x'][:] = x[order]
+            shared['y'][:] = y[order]
+            shared['energy'][:] = energy[order]
+            shared['tile_starts'][:] = np.r_[0, np.cumsum(np.bincount(tiles, minlength=self.workers))]
+            shared['food_cells'][:] = food_cells
+            shared['food_counts'][:] = food_counts
+
+            for connection, rng in zip(self.connections, rngs):
+                connection.send((shared.spec(), ticks, energy_gain, energy_loss, rng))
+            errors = []
+            waiting = dict(zip(self.connections, self.processes))
+            while waiting:
+                ready = wait(list(waiting) + [process.sentinel for process in waiting.values()])
+                for connection, process in list(waiting.items()):
+                    if connection not in ready and process.sentinel not in ready:
+                        continue
+                    del waiting[connection]
+                    try:
+                        if connection not in ready:
+                            raise EOFError
+                        reply = connection.recv()
+                    except EOFError:
+                        # The worker died, maybe holding the barrier's lock, so
+                        # the ones waiting at the barrier are stopped too
+                        for other in self.processes:
+                            other.terminate()
+                        process.join()
+                        reply = f'shard worker exited with code {process.exitcode}'
+                    if reply is not None:
+                        errors.append(reply)
+            if errors:
+                self.close()
+                # The other workers only report the barrier it left broken
+                cause = next((error for error in errors if 'BrokenBarrierError' not in error), errors[0])
+                raise RuntimeError('shard worker failed:\n' + cause)
+
+            x[:] = shared['x_out']
+            y[:] = shared['y_out']
+            energy[:] = shared['energy_out']
+            eaten = int(shared['eaten'].sum())
+            food.set_cells(food_cells, shared['food_counts'].copy())
+            food.eaten += eaten
+        finally:
+            shared.unlink()
+
+def shard_worker(connection, barrier, tiling, tile):
+    # Owns one tile: waits for a day's orders, runs the day, replies None on
+    # success or the traceback of what went wrong
+    x0, y0, tile_width, tile_height = tiling.bounds(tile)
+    while True:
+        order = connection.recv()
+        if order is None:
+            break
+        spec, ticks, energy_gain, energy_loss, rng = order
+        shared = SharedArrays.attach(spec)
+        try:
+            run_tile(shared, barrier, tiling, tile, x0, y0, tile_width, tile_height, ticks, energy_gain, energy_loss, rng)
+            reply = None
+        except Exception:
+            # Release the other workers from the barrier they are waiting at
+            barrier.abort()
+            reply = traceback.format_exc()
+        finally:
+            shared.close()
+        connection.send(reply)
+
+def run_tile(shared, barrier, tiling, tile, x0, y0, tile_width, tile_height, ticks, energy_gain, energy_loss, rng):
+    # Agents and food are kept in tile coordinates, so an agent has left the
+    # tile exactly when a coordinate falls outside [0, tile size); only those
+    # agents are wrapped around the torus and posted as migrants
+    start, end = shared['tile_starts'][tile:tile + 2]
+    index = shared['index'][start:end].copy()
+    x = shared['x'][start:end] - x0
+    y = shared['y'][start:end] - y0
+    energy = shared['energy'][start:end].copy()
+
+    food_cells = shared['food_cells']
+    food_x, food_y = np.divmod(food_cells, tiling.height)
+    mine = np.flatnonzero(tiling.tile_of(food_x, food_y) == tile)
+    local_cells = (food_x[mine] - x0) * tile_height + food_y[mine] - y0
+    food = food_store(tile_width, tile_height, int(shared['food_counts'][mine].sum()))
+    food.set_cells(local_cells, shared['food_counts'][mine])
+
+    migrant_counts = shared['migrant_counts']
+    migrants = shared['migrants']
+    for tick in range(ticks):
+        parity = tick % 2
+        steps = rng.integers(-1, 2, size=(2, len(x)))
+        x += steps[0]
+        y += steps[1]
+
+        leaving = (x < 0) | (x >= tile_width) | (y < 0) | (y >= tile_height)
+        migrant_counts[parity, tile] = np.count_nonzero(leaving)
+        barrier.wait()
+        offset = int(migrant_counts[parity, :tile].sum())
+        total = int(migrant_counts[parity].sum())
+        rows = migrants[parity, offset:offset + migrant_counts[parity, tile]]
+        rows[:, 0] = index[leaving]
+        rows[:, 1] = (x[leaving] + x0) % tiling.width
+        rows[:, 2] = (y[leaving] + y0) % tiling.height
+        rows[:, 3] = energy[leaving]
+        staying = ~leaving
+        index, x, y, energy = index[staying], x[staying], y[staying], energy[staying]
+        barrier.wait()
+
+        posted = migrants[parity, :total]
+        posted_x = posted[:, 1].astype(np.int64)
+        posted_y = posted[:, 2].astype(np.int64)
+        arriving = np.flatnonzero(tiling.tile_of(posted_x, posted_y) == tile)
+        if len(arriving):
+            index = np.concatenate([index, posted[arriving, 0].astype(np.int64)])
+            x = np.concatenate([x, posted_x[arriving] - x0])
+            y = np.concatenate([y, posted_y[arriving] - y0])
+            energy = np.concatenate([energy, posted[arriving, 3]])
+
+        energy[food.eat_all(x, y)] += energy_gain
+        energy -= energy_loss
+
+    shared['x_out'][index] = x + x0
+    shared['y_out'][index] = y + y0
+    shared['energy_out'][index] = energy
+    shared['food_counts'][mine] = food.counts_at(local_cells)
+    shared['eaten'][tile] = food.eaten
@@ -0,0 +1,40 @@
+class SpatialIndex:
+    # Items bucketed by cell of a wrapping width x height grid, so finding
+    # everything near a cell only looks at the (2 * radius + 1)^2 cells around
+    # it instead of every item. Buckets are insertion-ordered dicts, which keeps
+    # add/remove O(1) and neighbour order (and so seeded runs) reproducible.
+    def __init__(self, width, height):
+        self.width = width
+        self.height = height
+        self.buckets = {}
+
+    @classmethod
+    def build(cls, width, height, items):
+        # items have x and y attributes
+        index = cls(width, height)
+        for item in items:
+            index.add(item, item.x, item.y)
+        return index
+
+    def add(self, item, x, y):
+        self.buckets.setdefault(x * self.height + y, {})[item] = None
+
+    def remove(self, item, x, y):
+        cell = x * self.height + y
+        bucket = self.buckets[cell]
+        del bucket[item]
+        if not bucket:
+            del self.buckets[cell]
+
+    def move(self, item, old_x, old_y, x, y):
+        if (old_x, old_y) != (x, y):
+            self.remove(item, old_x, old_y)
+            self.add(item, x, y)
+
+    def neighbors(self, x, y, radius):
+        # Items within radius cells of (x, y) in both directions, (x, y) included
+        cells = dict.fromkeys(((x + dx) % self.width) * self.height + (y + dy) % self.height
+                              for dx in range(-radius, radius + 1)
+                              for dy in range(-radius, radius + 1))
+        for cell in cells:
+            yield from self.buckets.get(cell, ())
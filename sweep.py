@@ -0,0 +1,69 @@
+import csv
+import itertools
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from script_loader import load_script
+from seeding import child_seeds, python_rng
+
+# Grid keys that are Simulation arguments; every other key is a Config field
+SIMULATION_ARGS = ('env_width', 'env_height', 'starting_doves', 'starting_hawks', 'rounds')
+
+def expand_grid(grid):
+    # {'food_spawn_rate': [100, 200], 'day_length': [15]} -> one dict per combination
+    names = list(grid)
+    return [dict(zip(names, values)) for values in itertools.product(*(grid[name] for name in names))]
+
+def run_job(config_id, replicate, params, seed_sequence):
+    v3 = load_script('hawk&Dove_v3.py')
+    args = {
+        'env_width': v3.ENV_WIDTH,
+        'env_height': v3.ENV_HEIGHT,
+        'starting_doves': v3.STARTING_DOVES,
+        'starting_hawks': v3.STARTING_HAWKS,
+        'rounds': v3.ROUNDS,
+    }
+    config = {}
+    for name, value in params.items():
+        if name in SIMULATION_ARGS:
+            args[name] = value
+        else:
+            config[name] = value
+
+    simulation = v3.Simulation(args['env_width'], args['env_height'], args['starting_doves'], args['starting_hawks'],
+                               args['rounds'], config=v3.Config(**config), rng=python_rng(seed_sequence))
+    return [{'config': config_id, 'replicate': replicate, **params,
+             'round': record['round'], 'hawks': record['hawks'], 'doves': record['doves']}
+            for record in simulation.iter_rounds()]
+
+def sweep(grid, replicates, seed=0, max_workers=None):
+    # Runs every grid combination replicates times in a process pool and yields
+    # one row per (config, replicate, round) as soon as each job finishes
+    configs = expand_grid(grid)
+    seeds = child_seeds(seed, len(configs) * replicates)
+    with ProcessPoolExecutor(max_workers=max_workers) as pool:
+        futures = [pool.submit(run_job, config_id, replicate, params, seeds[config_id * replicates + replicate])
+                   for config_id, params in enumerate(configs)
+                   for replicate in range(replicates)]
+        for future in as_completed(futures):
+            yield from future.result()
+
+def write_csv(rows, file, fieldnames):
+    writer = csv.DictWriter(file, fieldnames=fieldnames)
+    writer.writeheader()
+    for row in rows:
+        writer.writerow(row)
+
+if __name__ == "__main__":
+    grid = {
+        'food_spawn_rate': [100, 200, 400],
+        'energy_gain_from_food': [30, 50],
+        'day_length': [15],
+        'starting_hawks': [25, 50],
+    }
+    fieldnames = ['config', 'replicate', *grid, 'round', 'hawks', 'doves']
+    if len(sys.argv) > 1:
+        with open(sys.argv[1], 'w', newline='') as file:
+            write_csv(sweep(grid, replicates=4), file, fieldnames)
+    else:
+        write_csv(sweep(grid, replicates=4), sys.stdout, fieldnames)
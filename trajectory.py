@@ -0,0 +1,178 @@
+import numpy as np
+
+from render import BackgroundWriter, FrameRenderer, open_encoder
+
+# Trajectory files record what a run looked like so it can be rendered later,
+# at any frame rate, without rerunning it. Layout (all little-endian):
+#
+#   header   b'TRAJ0001', int32 width, int32 height
+#   records  one per recorded tick, 8-byte aligned: int32 food cells,
+#            int16 food counts or count changes, int16 player x, int16 player y
+#   tables   TICK_DTYPE index of the records, ROUND_DTYPE per-round totals
+#   trailer  int64 tick table offset, tick count, round table offset, round
+#            count, then b'TRAJEND1'
+#
+# The first recorded tick of each round is a keyframe holding the full food
+# grid; later ticks of the round only hold the cells whose count changed.
+
+HEADER_MAGIC = b'TRAJ0001'
+TRAILER_MAGIC = b'TRAJEND1'
+TICK_DTYPE = np.dtype([('round', '<i4'), ('tick', '<i4'), ('offset', '<i8'), ('players', '<i4'),
+                       ('food_cells', '<i4'), ('keyframe', '<i1')])
+ROUND_DTYPE = np.dtype([('round', '<i4'), ('players', '<i4'), ('deaths', '<i4'), ('births', '<i4')])
+
+def counts_at(cells, counts, wanted):
+    # counts[i] of cells[i] (sorted) at every wanted cell, 0 for the others
+    if len(cells) == 0:
+        return np.zeros(len(wanted), dtype=np.int64)
+    index = np.minimum(np.searchsorted(cells, wanted), len(cells) - 1)
+    return np.where(cells[index] == wanted, counts[index], 0)
+
+class TrajectoryRecorder:
+    # Observer that appends every `every`th tick to a trajectory file at path
+    def __init__(self, path, width, height, every=1):
+        if max(width, height) > np.iinfo(np.int16).max:
+            raise ValueError('trajectory files store positions as int16')
+        self.file = open(path, 'wb')
+        self.file.write(HEADER_MAGIC + np.array([width, height], dtype='<i4').tobytes())
+        self.offset = len(HEADER_MAGIC) + 8
+        self.every = every
+        # Food as of the last recorded tick, as sorted stocked cells and counts
+        self.food_cells = np.zeros(0, dtype=np.int64)
+        self.food_counts = np.zeros(0, dtype=np.int64)
+        self.ticks = []
+        self.rounds = []
+        self.keyframe_round = None
+        # Death and birth totals as of the last round, taken from the simulation
+        # when it starts, so a resumed run's rounds are not counted from zero
+        self.deaths = 0
+        self.births = 0
+
+    def on_start(self, simulation):
+        self.deaths = simulation.death_count
+        self.births = simulation.breed_count
+
+    def on_tick(self, simulation, round, tick):
+        if tick % self.every:
+            return
+        cells, counts = simulation.env.food.stocked()
+        keyframe = round != self.keyframe_round
+        if keyframe:
+            changed, values = cells, counts
+            self.keyframe_round = round
+        else:
+            changed = np.union1d(self.food_cells, cells)
+            values = counts_at(cells, counts, changed) - counts_at(self.food_cells, self.food_counts, changed)
+            changed, values = changed[values != 0], values[values != 0]
+        self.food_cells, self.food_counts = cells, counts
+        x, y = simulation.player_positions()
+
+        record = b''.join([changed.astype('<i4').tobytes(), values.astype('<i2').tobytes(),
+                           np.asarray(x, dtype='<i2').tobytes(), np.asarray(y, dtype='<i2').tobytes()])
+        record += bytes(-len(record) % 8)
+        self.ticks.append((round, tick, self.offset, len(x), len(changed), keyframe))
+        self.file.write(record)
+        self.offset += len(record)
+
+    def on_round(self, simulation, round):
+        self.rounds.append((round, len(simulation.players), simulation.death_count - self.deaths,
+                            simulation.breed_count - self.births))
+        self.deaths = simulation.death_count
+        self.births = simulation.breed_count
+
+    def on_finish(self, simulation):
+        ticks = np.array(self.ticks, dtype=TICK_DTYPE)
+        rounds = np.array(self.rounds, dtype=ROUND_DTYPE)
+        self.file.write(ticks.tobytes())
+        self.file.write(rounds.tobytes())
+        rounds_offset = self.offset + ticks.nbytes
+        self.file.write(np.array([self.offset, len(ticks), rounds_offset, len(rounds)], dtype='<i8').tobytes())
+        self.file.write(TRAILER_MAGIC)
+        self.file.close()
+
+class Trajectory:
+    # Read side of a trajectory file; the file is memory-mapped, so only the
+    # ticks that are actually replayed get read from disk
+    def __init__(self, path):
+        self.data = np.memmap(path, dtype=np.uint8, mode='r')
+        if bytes(self.data[:8]) != HEADER_MAGIC or bytes(self.data[-8:]) != TRAILER_MAGIC:
+            raise ValueError(f'{path} is not a complete trajectory file')
+        self.width, self.height = (int(value) for value in self.data[8:16].view('<i4'))
+        ticks_offset, tick_count, rounds_offset, round_count = self.data[-40:-8].view('<i8')
+        self.ticks = self.data[ticks_offset:ticks_offset + tick_count * TICK_DTYPE.itemsize].view(TICK_DTYPE)
+        self.rounds = self.data[rounds_offset:rounds_offset + round_count * ROUND_DTYPE.itemsize].view(ROUND_DTYPE)
+
+    def record(self, index):
+        # (food cells, food values, x, y) of the index-th recorded tick
+        entry = self.ticks[index]
+        start, players, food_cells = int(entry['offset']), int(entry['players']), int(entry['food_cells'])
+        cells = self.data[start:start + 4 * food_cells].view('<i4')
+        start += 4 * food_cells
+        values = self.data[start:start + 2 * food_cells].view('<i2')
+        start += 2 * food_cells
+        x = self.data[start:start + 2 * players].view('<i2')
+        y = self.data[start + 2 * players:start + 4 * players].view('<i2')
+        return cells, values, x, y
+
+    def frames(self, rounds=None, every=1):
+        # Yields (round, tick, food counts, x, y) for every `every`th recorded
+        # tick of rounds (all rounds by default). The food counts array is
+        # reused from frame to frame.
+        food = np.zeros(self.width * self.height, dtype=np.int64)
+        wanted = np.ones(len(self.ticks), dtype=bool) if rounds is None else np.isin(self.ticks['round'], rounds)
+        shown = 0
+        current_round = None
+        for index in np.flatnonzero(wanted):
+            entry = self.ticks[index]
+            if entry['round'] != current_round:
+                # Rebuild the food from the round's keyframe up to this tick
+                current_round = entry['round']
+                start = index
+                while not self.ticks[start]['keyframe']:
+                    start -= 1
+                for earlier in range(start, index):
+                    self.apply_food(food, earlier)
+            self.apply_food(food, index)
+            if shown % every == 0:
+                _, _, x, y = self.record(index)
+                yield int(entry['round']), int(entry['tick']), food, x, y
+            shown += 1
+
+    def apply_food(self, food, index):
+        cells, values, _, _ = self.record(index)
+        if self.ticks[index]['keyframe']:
+            food[:] = 0
+            food[cells] = values
+        else:
+            food[cells] += values
+
+    def render(self, path, rounds=None, every=1, scale=4, fps=20):
+        renderer = FrameRenderer(self.width, self.height, scale)
+        frame_height, frame_width = renderer.frame.shape
+        writer = BackgroundWriter(open_encoder(path, frame_width, frame_height, renderer.palette, fps))
+        try:
+            for round, tick, food, x, y in self.frames(rounds, every):
+                food_x, food_y = np.divmod(np.flatnonzero(food), self.height)
+                writer.write(renderer.render([(food_x, food_y, 'green'), (x, y, 'blue')]))
+        finally:
+            writer.close()
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Inspect or render a recorded trajectory.')
+    parser.add_argument('trajectory')
+    parser.add_argument('output', nargs='?', help='.gif or .mp4 to render to; without it, print the rounds')
+    parser.add_argument('--rounds', nargs='*', type=int, help='rounds to render (default: all)')
+    parser.add_argument('--every', type=int, default=1, help='render every n-th recorded tick')
+    parser.add_argument('--scale', type=int, default=4)
+    parser.add_argument('--fps', type=int, default=20)
+    args = parser.parse_args()
+
+    trajectory = Trajectory(args.trajectory)
+    if args.output:
+        trajectory.render(args.output, args.rounds, args.every, args.scale, args.fps)
+    else:
+        print(f"{trajectory.width}x{trajectory.height} grid, {len(trajectory.ticks)} recorded ticks")
+        for round, players, deaths, births in trajectory.rounds.tolist():
+            print(f"Round {round}: players = {players}, deaths = {deaths}, births = {births}")
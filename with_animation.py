@@ -1,7 +1,11 @@
 import random
 import time
-from matplotlib import pyplot as plt
-from matplotlib.animation import FuncAnimation
+import numpy as np
+
+from agents import AgentArray, Population
+from food import food_store
+from kernels import random_steps, resolve_backend, run_day
+from seeding import numpy_rng
 
 # Constants
 ENV_WIDTH = 100
@@ -20,12 +24,13 @@ BASE_ENERGY_REQUIRED_FOR_REPRODUCTION = 200
 STATUS_ACTIVE = "active"
 STATUS_RESTING = "resting"
 MUTATION_PROBABILITY=0.1
+GENOME_LENGTH = 4
 # increase no. of ilteration in a day so that population get chance to eat food.
-def mutate_genome_sequence(sequence):
+def mutate_genome_sequence(sequence, rng=random):
     sequence_list = list(sequence)
     for i in range(len(sequence_list)):
-        if random.random() < MUTATION_PROBABILITY:
-            sequence_list[i] = random.choice('ATGC')
+        if rng.random() < MUTATION_PROBABILITY:
+            sequence_list[i] = rng.choice('ATGC')
     return ''.join(sequence_list)
 class Genome:
     def __init__(self, sequence):
@@ -54,31 +59,42 @@ class Agent:
         # print(self.energy_required_for_living,self.energy_required_for_reproduction)
         self.status = STATUS_ACTIVE
 
-    def move(self, env_width, env_height):
-        self.x = (self.x + random.choice([-1, 0, 1])) % env_width
-        self.y = (self.y + random.choice([-1, 0, 1])) % env_height
+    def move(self, env_width, env_height, rng=random):
+        self.x = (self.x + rng.choice([-1, 0, 1])) % env_width
+        self.y = (self.y + rng.choice([-1, 0, 1])) % env_height
         # print(self.x,self.y)
 
-    def eat(self, food_positions):
-        if (self.x, self.y) in food_positions:
+    def eat(self, food):
+        if food.take(self.x, self.y):
             # print("yes")
             self.energy += ENERGY_GAIN_FROM_FOOD
             # print(self.energy)
-            food_positions.remove((self.x, self.y))
 
 class Environment:
-    def __init__(self, width, height):
+    def __init__(self, width, height, rng=None):
         self.width = width
         self.height = height
-        self.food_positions = []
+        self.rng = rng if rng is not None else np.random.default_rng()
+        self.food = food_store(width, height, FOOD_SPAWN_RATE)
+
+    @property
+    def food_positions(self):
+        return self.food.positions()
 
     def spawn_food(self):
-        for _ in range(FOOD_SPAWN_RATE):
-            self.food_positions.append((random.randint(0, self.width - 1), random.randint(0, self.height - 1)))
+        self.food.add_many(self.rng.integers(0, self.width, FOOD_SPAWN_RATE),
+                           self.rng.integers(0, self.height, FOOD_SPAWN_RATE))
 
 class Simulation:
-    def __init__(self, env_width, env_height, starting_players, rounds):
-        self.env = Environment(env_width, env_height)
+    # backend picks how day_phase runs (see kernels); anything but 'python'
+    # draws its moves from a numpy Generator seeded from rng. verbose prints
+    # the food count every frame and every agent cull keeps or removes.
+    def __init__(self, env_width, env_height, starting_players, rounds, rng=random, backend='python', verbose=False):
+        self.rng = rng
+        self.verbose = verbose
+        self.backend = resolve_backend(backend)
+        self.kernel_rng = self.new_kernel_rng() if self.backend != 'python' else None
+        self.env = Environment(env_width, env_height, numpy_rng(rng))
         self.players = self.init_players(starting_players)
         self.rounds = rounds
         self.graph_player_points = []
@@ -86,21 +102,23 @@ class Simulation:
     def init_players(self, players):
         players_list = []
         for _ in range(players):
-            genome_sequence = ''.join(random.choices('ATGC', k=4))  # Example genome sequence
+            genome_sequence = ''.join(self.rng.choices('ATGC', k=GENOME_LENGTH))  # Example genome sequence
             # print(genome_sequence)
             genome = Genome(genome_sequence)
-            players_list.append(Agent(random.randint(0, ENV_WIDTH - 1), random.randint(0, ENV_HEIGHT - 1), genome))
-        return players_list
+            players_list.append(Agent(self.rng.randint(0, self.env.width - 1), self.rng.randint(0, self.env.height - 1), genome))
+        return Population(players_list)
 
     
     def run(self):
+        from matplotlib import pyplot as plt
+        from matplotlib.animation import FuncAnimation
+
         fig, ax = plt.subplots()
-        ax.set_xlim(0, ENV_WIDTH)
-        ax.set_ylim(0, ENV_HEIGHT)
+        ax.set_xlim(0, self.env.width)
+        ax.set_ylim(0, self.env.height)
 
-        player_scat = ax.scatter([player.x for player in self.players], 
-                                 [player.y for player in self.players], 
-                                 c='blue',marker='x')
+        player_x, player_y = self.player_positions()
+        player_scat = ax.scatter(player_x, player_y, c='blue',marker='x')
 
         food_scat = ax.scatter([food[0] for food in self.env.food_positions],
                                [food[1] for food in self.env.food_positions],
@@ -114,30 +132,66 @@ class Simulation:
             self.cull()
             self.breed()
 
-            xdata = [player.x for player in self.players]
-            ydata = [player.y for player in self.players]
+            xdata, ydata = self.player_positions()
             
             player_scat.set_offsets(list(zip(xdata, ydata)))
 
             food_xdata = [food[0] for food in self.env.food_positions]
             food_ydata = [food[1] for food in self.env.food_positions]
-            print(len(food_xdata),len(self.env.food_positions))
+            if self.verbose:
+                print(len(food_xdata),len(self.env.food_positions))
             food_scat.set_offsets(list(zip(food_xdata, food_ydata)))
-            self.env.food_positions=[]
+            self.env.food.clear()
             return player_scat, food_scat
 
         animation = FuncAnimation(fig, update, frames=range(self.rounds), blit=True, repeat=False)
         plt.show()
 
+    def record(self, recorder):
+        # The rounds run() animates, rendered offscreen by recorder (see render.py)
+        # as one frame per round, taken after breeding like run()'s frames; the
+        # recorder's tick filter does not apply, as there are no ticks to skip
+        for round in range(1, self.rounds + 1):
+            self.env.spawn_food()
+            self.day_phase()
+            self.night_phase()
+            self.cull()
+            self.breed()
+            recorder.write_frame(self)
+            self.env.food.clear()
+        recorder.on_finish(self)
+
     def day_phase(self):
+        if self.backend != 'python':
+            return self.kernel_day_phase()
         for day in range(DAY_LENGTH):
             for player in self.players:
-                player.move(self.env.width, self.env.height)
-                player.eat(self.env.food_positions)
+                player.move(self.env.width, self.env.height, self.rng)
+                player.eat(self.env.food)
                 # print(player.genome.sequence)
                 player.energy -= ENERGY_LOSS_PER_DAY/DAY_LENGTH
                 # [print(player.energy)]
             # self.plot_environment(day)
+
+    def kernel_day_phase(self):
+        x, y, energy = self.player_state()
+        run_day(self.backend, x, y, energy, self.env.food, random_steps(self.kernel_rng, DAY_LENGTH, len(x)),
+                ENERGY_GAIN_FROM_FOOD, ENERGY_LOSS_PER_DAY/DAY_LENGTH)
+        self.set_player_state(x, y, energy)
+
+    def new_kernel_rng(self):
+        return numpy_rng(self.rng)
+
+    def player_state(self):
+        return (np.array([player.x for player in self.players], dtype=np.int64),
+                np.array([player.y for player in self.players], dtype=np.int64),
+                np.array([player.energy for player in self.players], dtype=np.float64))
+
+    def set_player_state(self, x, y, energy):
+        for player, player_x, player_y, player_energy in zip(self.players, x.tolist(), y.tolist(), energy.tolist()):
+            player.x = player_x
+            player.y = player_y
+            player.energy = player_energy
             
         
 
@@ -151,36 +205,40 @@ class Simulation:
     def cull(self):
         dead_players = 0
         new_players = []
-        total_fitness = sum(player.fitness for player in self.players)
+        removed_players = []
+        total_fitness = self.players.total_fitness
     
         for player in self.players:
             survival_probability = player.fitness*20 / total_fitness
             # print(survival_probability,random.random())
             # print(player.fitness)
             # print(player.energy,player.genome)
-            if player.energy < player.energy_required_for_living or random.random() > survival_probability:
+            if player.energy < player.energy_required_for_living or self.rng.random() > survival_probability:
                 dead_players += 1
-                print("dead")
+                removed_players.append(player)
+                if self.verbose:
+                    print("dead")
             else:
                 new_players.append(player)
-                print("append")
-        self.players = new_players
+                if self.verbose:
+                    print("append")
+        self.players.replace(new_players, removed_players)
         return dead_players
 
     def breed(self):
         player_babies = 0
         new_players = []
 
-        total_fitness = sum(player.fitness for player in self.players)
+        total_fitness = self.players.total_fitness
         
         for player in self.players:
             reproduction_probability = player.fitness*20 / total_fitness
-            if player.energy >= player.energy_required_for_reproduction and random.random() <= reproduction_probability:
+            if player.energy >= player.energy_required_for_reproduction and self.rng.random() <= reproduction_probability:
                 player.energy //= 2
-                genome_sequence =mutate_genome_sequence(player.genome.sequence)
+                genome_sequence =mutate_genome_sequence(player.genome.sequence, self.rng)
                 # print(player.genome.sequence,genome_sequence)
                 genome = Genome(genome_sequence)
-                new_players.append(Agent(random.randint(0, ENV_WIDTH - 1), random.randint(0, ENV_HEIGHT - 1), genome))
+                new_players.append(Agent(self.rng.randint(0, self.env.width - 1), self.rng.randint(0, self.env.height - 1), genome))
                 player_babies += 1
 
         self.players.extend(new_players)
@@ -189,11 +247,15 @@ class Simulation:
 
     def get_count(self):
         return len(self.players)
+
+    def player_positions(self):
+        return [player.x for player in self.players], [player.y for player in self.players]
     
     def plot_environment(self, day):
+        from matplotlib import pyplot as plt
         plt.figure(figsize=(8, 8))
-        plt.xlim(0, ENV_WIDTH)
-        plt.ylim(0, ENV_HEIGHT)
+        plt.xlim(0, self.env.width)
+        plt.ylim(0, self.env.height)
 
         food_x, food_y = zip(*self.env.food_positions)
         plt.scatter(food_x, food_y, c='green', label='Food', marker='*')
@@ -210,12 +272,58 @@ class Simulation:
         plt.close('all')
 
     def plot_results(self):
+        from matplotlib import pyplot as plt
         plt.plot(self.graph_player_points, label="players")
         plt.xlabel("Rounds")
         plt.ylabel("Population")
         plt.legend()
         plt.show()
 
+class ArraySimulation(Simulation):
+    # Players are kept in an AgentArray, so every phase runs as whole-population
+    # array operations instead of a Python loop over Agent objects. The
+    # 'numba' (or 'auto') and 'events' backends swap the per-tick day loop for
+    # a kernel; 'numpy' keeps the loop below.
+    def __init__(self, env_width, env_height, starting_players, rounds, rng=None, backend='numpy', verbose=False):
+        rng = rng if rng is not None else np.random.default_rng()
+        super().__init__(env_width, env_height, starting_players, rounds, rng=rng, backend=backend, verbose=verbose)
+
+    def init_players(self, players):
+        return AgentArray.random(players, self.env.width, self.env.height, STARTING_ENERGY, GENOME_LENGTH, self.rng)
+
+    def new_kernel_rng(self):
+        return self.rng
+
+    def player_state(self):
+        return self.players.x, self.players.y, self.players.energy
+
+    def set_player_state(self, x, y, energy):
+        self.players.x = x
+        self.players.y = y
+        self.players.energy = energy
+
+    def day_phase(self):
+        if self.backend in ('numba', 'events'):
+            return self.kernel_day_phase()
+        for day in range(DAY_LENGTH):
+            self.players.move(self.env.width, self.env.height, self.rng)
+            self.players.eat(self.env.food, ENERGY_GAIN_FROM_FOOD)
+            self.players.lose_energy(ENERGY_LOSS_PER_DAY/DAY_LENGTH)
+
+    def night_phase(self):
+        for night in range(NIGHT_LENGTH):
+            self.players.lose_energy(ENERGY_LOSS_PER_NIGHT/NIGHT_LENGTH)
+
+    def cull(self):
+        return self.players.cull(BASE_ENERGY_REQUIRED_FOR_LIVING, self.rng)
+
+    def breed(self):
+        return self.players.breed(BASE_ENERGY_REQUIRED_FOR_REPRODUCTION, self.env.width, self.env.height,
+                                  STARTING_ENERGY, MUTATION_PROBABILITY, self.rng)
+
+    def player_positions(self):
+        return self.players.x, self.players.y
+
 if __name__ == "__main__":
-    simulation = Simulation(ENV_WIDTH, ENV_HEIGHT, STARTING_PLAYERS, ROUNDS)
+    simulation = Simulation(ENV_WIDTH, ENV_HEIGHT, STARTING_PLAYERS, ROUNDS, verbose=True)
     simulation.run()